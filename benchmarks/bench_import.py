@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks what the plugin costs a pytest session that doesn't use it.
+
+Every round runs in fresh subprocesses:
+
+- ``import``: the cumulative import time of ``pytest_docker_db.plugin``,
+  from ``python -X importtime``, including everything it imports.
+- ``collect``: the wall time of ``pytest --collect-only`` of a test that
+  doesn't use a database.
+- ``collect-disabled``: the same with ``-p no:docker-db``, the difference
+  to ``collect`` is what the plugin costs.
+
+The modules that should only be imported once a database is used, see
+``HEAVY_MODULES``, are reported when the plugin imports them. The results
+are compared against a baseline like in ``bench_lifecycle.py``::
+
+    python benchmarks/bench_import.py
+    python benchmarks/bench_import.py --save-baseline
+
+The exit code is 1 if anything got slower than the baseline allows or a
+heavy module is imported.
+"""
+
+import argparse
+import json
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+from bench_lifecycle import _format, _rounded, compare
+
+HERE = Path(__file__).parent
+DEFAULT_BASELINE = HERE / "baseline_import.json"
+PLUGIN = "pytest_docker_db.plugin"
+
+#: imported on first use of docker, asyncio or the connection pools
+HEAVY_MODULES = (
+    "docker",
+    "requests",
+    "urllib3",
+    "asyncio",
+    "pytest_docker_db.aio",
+    "pytest_docker_db.connections",
+)
+
+# import time: self [us] | cumulative | imported package
+_IMPORTTIME = re.compile(r"import time:\s+\d+ \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def import_time() -> float:
+    """:return: the cumulative import time of the plugin, in seconds."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {PLUGIN}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    for match in _IMPORTTIME.finditer(result.stderr):
+        if match.group(3) == PLUGIN:
+            return int(match.group(1)) / 1e6
+    raise RuntimeError(f"{PLUGIN} is not in the output:\n{result.stderr}")
+
+
+def heavy_imports() -> List[str]:
+    """:return: the ``HEAVY_MODULES`` that importing the plugin imports."""
+    code = (
+        f"import sys, {PLUGIN}\n"
+        f"print(' '.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return result.stdout.split()
+
+
+def collect_time(root: Path, disabled: bool) -> float:
+    """:return: the wall time of collecting the tests in ``root``."""
+    args = [sys.executable, "-m", "pytest", "--collect-only", "-q"]
+    args += ["-p", "no:cacheprovider"]
+    if disabled:
+        args += ["-p", "no:docker-db"]
+    start = time.monotonic()
+    result = subprocess.run(args, cwd=root, capture_output=True, text=True)
+    elapsed = time.monotonic() - start
+    if result.returncode != 0:
+        raise RuntimeError(f"pytest failed:\n{result.stdout}\n{result.stderr}")
+    return elapsed
+
+
+def run(rounds: int) -> Dict[str, Dict[str, float]]:
+    runs = []
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        (root / "pytest.ini").write_text("[pytest]\n")
+        (root / "test_plain.py").write_text("def test_plain():\n    pass\n")
+        for _ in range(rounds):
+            runs.append(
+                {
+                    "import": import_time(),
+                    "collect": collect_time(root, disabled=False),
+                    "collect-disabled": collect_time(root, disabled=True),
+                }
+            )
+    # the median of every measurement over the rounds
+    results = {
+        "plugin": {
+            key: statistics.median(r[key] for r in runs) for key in runs[0]
+        }
+    }
+    print(_format("plugin", results["plugin"]))
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rounds", type=int, default=7)
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="Save the results as the baseline instead of comparing.",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="How much slower than the baseline is acceptable, 0.25 is 25%%.",
+    )
+    parser.add_argument(
+        "--min-delta",
+        type=float,
+        default=0.02,
+        help="Differences of fewer seconds are never a regression.",
+    )
+    args = parser.parse_args(argv)
+
+    heavy = heavy_imports()
+    if heavy:
+        print(f"HEAVY IMPORTS {' '.join(heavy)}")
+    results = run(args.rounds)
+
+    if args.save_baseline:
+        args.baseline.write_text(
+            json.dumps(_rounded(results), indent=2) + "\n"
+        )
+        return 0
+
+    if not args.baseline.exists():
+        print(f"No baseline at {args.baseline}, use --save-baseline.")
+        return 1 if heavy else 0
+    baseline = json.loads(args.baseline.read_text())
+    regressions = compare(results, baseline, args.tolerance, args.min_delta)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions or heavy else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks the container life cycle of ``docker_db`` against a fake daemon.
+
+Every scenario runs pytest in a subprocess that talks to
+:class:`fake_docker.FakeDocker` and reads the phase timings of the session
+from ``--db-timings-json``. The results can be saved as a baseline and later
+runs are compared against it::
+
+    python benchmarks/bench_lifecycle.py --save-baseline
+    python benchmarks/bench_lifecycle.py --latency ready=0.5
+
+The exit code is 1 if any phase got slower than the baseline allows.
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+from fake_docker import DEFAULT_LATENCIES, FakeDocker
+
+HERE = Path(__file__).parent
+DEFAULT_BASELINE = HERE / "baseline.json"
+
+#: name, existing containers, xdist workers, services
+SCENARIOS = [
+    ("single", 0, 0, 0),
+    ("existing-100", 100, 0, 0),
+    ("existing-1000", 1000, 0, 0),
+    ("services-2", 0, 0, 2),
+    ("services-4", 0, 0, 4),
+    ("workers-2", 0, 2, 0),
+    ("workers-4", 0, 4, 0),
+]
+
+_INI = """\
+[pytest]
+db-image = bench-db:latest
+db-port = 5432
+"""
+
+_SERVICE = """
+[docker-db:service-{i}]
+db-image = bench-db:latest
+db-port = 5432
+"""
+
+
+def run_scenario(
+    existing: int,
+    workers: int,
+    services: int,
+    latencies: Dict[str, float],
+    teardown: str = "kill",
+) -> Dict[str, float]:
+    """
+    Runs one pytest session against a fresh fake daemon.
+
+    :return: the wall time of the ``session`` and the total seconds of
+        every phase.
+    """
+    daemon = FakeDocker(latencies, existing=existing)
+    daemon.start_thread()
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            ini = _INI + "".join(_SERVICE.format(i=i) for i in range(services))
+            (root / "pytest.ini").write_text(ini)
+            fixture = "docker_dbs" if services else "docker_db"
+            tests = "".join(
+                f"def test_{i}({fixture}):\n    assert {fixture}\n\n"
+                for i in range(max(workers, 1) * 2)
+            )
+            (root / "test_bench.py").write_text(tests)
+
+            args = [sys.executable, "-m", "pytest", "-q", "-p"]
+            args += ["no:cacheprovider", "--db-timings-json=timings.json"]
+            args += [f"--db-teardown={teardown}"]
+            if workers:
+                args += ["-n", str(workers)]
+            env = dict(os.environ, DOCKER_HOST=daemon.base_url)
+
+            start = time.monotonic()
+            result = subprocess.run(
+                args, cwd=root, env=env, capture_output=True, text=True
+            )
+            session = time.monotonic() - start
+            if result.returncode != 0:
+                raise RuntimeError(
+                    f"pytest failed:\n{result.stdout}\n{result.stderr}"
+                )
+            phases = json.loads((root / "timings.json").read_text())["phases"]
+    finally:
+        daemon.close()
+
+    results = {"session": session}
+    results.update({name: p["total"] for name, p in phases.items()})
+    return results
+
+
+def run(
+    scenarios: List[str],
+    rounds: int,
+    latencies: Dict[str, float],
+    teardown: str = "kill",
+) -> Dict[str, Dict[str, float]]:
+    has_xdist = importlib.util.find_spec("xdist") is not None
+    results = {}
+    for name, existing, workers, services in SCENARIOS:
+        if scenarios and name not in scenarios:
+            continue
+        if workers and not has_xdist:
+            print(f"{name}: skipped, pytest-xdist is not installed")
+            continue
+        runs = [
+            run_scenario(existing, workers, services, latencies, teardown)
+            for _ in range(rounds)
+        ]
+        # the median of every measurement over the rounds
+        results[name] = {
+            key: statistics.median(r.get(key, 0.0) for r in runs)
+            for key in runs[0]
+        }
+        print(_format(name, results[name]))
+    return results
+
+
+def compare(
+    results: Dict[str, Dict[str, float]],
+    baseline: Dict[str, Dict[str, float]],
+    tolerance: float,
+    min_delta: float,
+) -> List[str]:
+    """
+    :return: a description of every measurement that is slower than
+        ``tolerance`` allows. Differences below ``min_delta`` seconds are
+        noise and never count.
+    """
+    regressions = []
+    for name, measurements in results.items():
+        for key, seconds in measurements.items():
+            expected = baseline.get(name, {}).get(key)
+            if expected is None:
+                continue
+            if seconds - expected < min_delta:
+                continue
+            if seconds > expected * (1 + tolerance):
+                regressions.append(
+                    f"{name} {key}: {seconds:.3f}s, the baseline is "
+                    f"{expected:.3f}s"
+                )
+    return regressions
+
+
+def _rounded(results: Dict[str, Dict[str, float]]):
+    return {
+        name: {key: round(seconds, 4) for key, seconds in m.items()}
+        for name, m in results.items()
+    }
+
+
+def _format(name: str, measurements: Dict[str, float]) -> str:
+    parts = " ".join(f"{k}={v:.3f}s" for k, v in measurements.items())
+    return f"{name:<15}{parts}"
+
+
+def _latency(value: str):
+    op, _, seconds = value.partition("=")
+    if op not in DEFAULT_LATENCIES:
+        raise argparse.ArgumentTypeError(
+            f"unknown operation {op!r}, one of {', '.join(DEFAULT_LATENCIES)}"
+        )
+    return op, float(seconds)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--scenario",
+        action="append",
+        default=[],
+        choices=[s[0] for s in SCENARIOS],
+        help="Only run this scenario, can be repeated.",
+    )
+    parser.add_argument(
+        "--latency",
+        action="append",
+        default=[],
+        type=_latency,
+        help="The latency of a daemon operation, e.g. create=0.05.",
+    )
+    parser.add_argument(
+        "--teardown",
+        default="kill",
+        choices=("kill", "stop", "background"),
+        help="The --db-teardown of the sessions.",
+    )
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="Save the results as the baseline instead of comparing.",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="How much slower than the baseline is acceptable, 0.25 is 25%%.",
+    )
+    parser.add_argument(
+        "--min-delta",
+        type=float,
+        default=0.05,
+        help="Differences of fewer seconds are never a regression.",
+    )
+    args = parser.parse_args(argv)
+
+    results = run(
+        args.scenario, args.rounds, dict(args.latency), args.teardown
+    )
+
+    if args.save_baseline:
+        baseline = {}
+        if args.baseline.exists():
+            baseline = json.loads(args.baseline.read_text())
+        baseline.update(results)
+        args.baseline.write_text(
+            json.dumps(_rounded(baseline), indent=2) + "\n"
+        )
+        return 0
+
+    if not args.baseline.exists():
+        print(f"No baseline at {args.baseline}, use --save-baseline.")
+        return 0
+    baseline = json.loads(args.baseline.read_text())
+    regressions = compare(results, baseline, args.tolerance, args.min_delta)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
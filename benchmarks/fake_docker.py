@@ -0,0 +1,325 @@
+# -*- coding: utf-8 -*-
+"""
+A stand-in for the Docker Engine API, just enough of it to run ``docker_db``.
+
+Containers don't run anything, starting one opens a TCP listener on its
+published port after ``latencies["ready"]`` seconds, which is what the
+plugin's TCP readiness probe waits for. Every other endpoint sleeps for its
+configured latency before it answers, so the cost of round trips to a slow
+daemon can be simulated.
+"""
+
+import json
+import re
+import socket
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional
+from urllib.parse import parse_qs, unquote, urlparse
+
+API_VERSION = "1.41"
+
+#: the default latency of every operation, in seconds
+DEFAULT_LATENCIES = {
+    "version": 0.0,
+    "list": 0.0,
+    "inspect": 0.0,
+    "image": 0.0,
+    "create": 0.0,
+    "start": 0.0,
+    "ready": 0.0,
+    "kill": 0.0,
+    "stop": 0.0,
+    "rename": 0.0,
+    "remove": 0.0,
+}
+
+
+class _Container:
+    def __init__(self, name: str, config: Dict[str, Any]):
+        self.id = uuid.uuid4().hex + uuid.uuid4().hex
+        self.name = name
+        self.config = config
+        self.status = "created"
+        self.ports: Dict[str, Optional[str]] = {}
+        self._listener: Optional[socket.socket] = None
+
+    def start(self, ready_after: float) -> None:
+        self.status = "running"
+        bindings = self.config.get("HostConfig", {}).get("PortBindings") or {}
+        for port, binding in bindings.items():
+            host_port = int((binding or [{}])[0].get("HostPort") or 0)
+            listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            listener.bind(("127.0.0.1", host_port))
+            self.ports[port] = str(listener.getsockname()[1])
+            self._listener = listener
+            threading.Thread(
+                target=self._serve, args=(ready_after,), daemon=True
+            ).start()
+
+    def _serve(self, ready_after: float) -> None:
+        # the port is published right away but nothing answers until the
+        # "database" is ready, like docker's userland proxy
+        time.sleep(ready_after)
+        listener = self._listener
+        if listener is None:
+            return
+        listener.listen(16)
+        while True:
+            try:
+                conn, _ = listener.accept()
+            except OSError:
+                return
+            with conn:
+                conn.sendall(b"R")
+
+    def stop(self) -> None:
+        self.status = "exited"
+        if self._listener is not None:
+            self._listener.close()
+            self._listener = None
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "Id": self.id,
+            "Names": [f"/{self.name}"],
+            "Image": self.config.get("Image"),
+            "Labels": self.config.get("Labels") or {},
+            "State": self.status,
+        }
+
+    def inspect(self) -> Dict[str, Any]:
+        return {
+            "Id": self.id,
+            "Name": f"/{self.name}",
+            "Image": self.config.get("Image"),
+            "State": {
+                "Status": self.status,
+                "Running": self.status == "running",
+            },
+            "Config": {
+                "Image": self.config.get("Image"),
+                "Env": self.config.get("Env") or [],
+                "Labels": self.config.get("Labels") or {},
+            },
+            "NetworkSettings": {
+                "Ports": {
+                    port: [{"HostIp": "0.0.0.0", "HostPort": host_port}]
+                    for port, host_port in self.ports.items()
+                }
+            },
+        }
+
+
+class FakeDocker(ThreadingHTTPServer):
+    """
+    Serves the fake Engine API on ``127.0.0.1``, use ``base_url`` as
+    ``DOCKER_HOST``.
+
+    :param latencies: overrides of :data:`DEFAULT_LATENCIES`.
+    :param existing: how many unrelated, stopped containers there are.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        latencies: Optional[Dict[str, float]] = None,
+        existing: int = 0,
+    ):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.latencies = dict(DEFAULT_LATENCIES, **(latencies or {}))
+        self.containers: Dict[str, _Container] = {}
+        self.lock = threading.Lock()
+        for i in range(existing):
+            container = _Container(f"existing-{i}", {"Image": "busybox"})
+            container.status = "exited"
+            self.containers[container.id] = container
+
+    @property
+    def base_url(self) -> str:
+        return f"tcp://127.0.0.1:{self.server_address[1]}"
+
+    def start_thread(self) -> threading.Thread:
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+    def find(self, ref: str) -> Optional[_Container]:
+        with self.lock:
+            for container in self.containers.values():
+                if ref in (container.id, container.name):
+                    return container
+                if len(ref) >= 12 and container.id.startswith(ref):
+                    return container
+        return None
+
+    def close(self) -> None:
+        self.shutdown()
+        self.server_close()
+        for container in list(self.containers.values()):
+            container.stop()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: FakeDocker
+    protocol_version = "HTTP/1.1"
+    # the headers and the body are written separately, without this every
+    # response waits for the client's delayed ACK
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_DELETE(self):
+        self._dispatch("DELETE")
+
+    def _dispatch(self, method: str) -> None:
+        url = urlparse(self.path)
+        path = re.sub(r"^/v[0-9.]+", "", unquote(url.path))
+        query = parse_qs(url.query)
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}") if length else {}
+
+        for pattern, handler in _ROUTES.get(method, ()):
+            match = re.fullmatch(pattern, path)
+            if match:
+                op, status, response = handler(
+                    self.server, query, body, *match.groups()
+                )
+                time.sleep(self.server.latencies.get(op, 0.0))
+                return self._respond(status, response)
+        self._respond(404, {"message": f"{method} {path} is not faked"})
+
+    def _respond(self, status: int, response: Any) -> None:
+        data = b"" if response is None else json.dumps(response).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def _not_found(ref: str):
+    return 404, {"message": f"No such container: {ref}"}
+
+
+def _version(server, query, body):
+    return "version", 200, {"ApiVersion": API_VERSION, "Version": "fake"}
+
+
+def _list(server, query, body):
+    filters = json.loads(query.get("filters", ["{}"])[0])
+    show_all = query.get("all", ["0"])[0] not in ("0", "false")
+    with server.lock:
+        found = [c.summary() for c in server.containers.values()]
+    if not show_all:
+        found = [c for c in found if c["State"] == "running"]
+    for name in filters.get("name", []):
+        found = [
+            c for c in found if any(re.search(name, n) for n in c["Names"])
+        ]
+    for label in filters.get("label", []):
+        key, _, value = label.partition("=")
+        found = [
+            c
+            for c in found
+            if key in c["Labels"] and (not value or c["Labels"][key] == value)
+        ]
+    return "list", 200, found
+
+
+def _inspect(server, query, body, ref):
+    container = server.find(ref)
+    if container is None:
+        return ("inspect",) + _not_found(ref)
+    return "inspect", 200, container.inspect()
+
+
+def _image(server, query, body, name):
+    # every image is available locally, nothing is ever pulled
+    return (
+        "image",
+        200,
+        {"Id": f"sha256:{uuid.uuid5(uuid.NAMESPACE_URL, name).hex}"},
+    )
+
+
+def _create(server, query, body):
+    name = query.get("name", [uuid.uuid4().hex[:12]])[0]
+    if server.find(name) is not None:
+        return "create", 409, {"message": f"Conflict, {name} is in use"}
+    container = _Container(name, body)
+    with server.lock:
+        server.containers[container.id] = container
+    return "create", 201, {"Id": container.id, "Warnings": []}
+
+
+def _start(server, query, body, ref):
+    container = server.find(ref)
+    if container is None:
+        return ("start",) + _not_found(ref)
+    container.start(server.latencies["ready"])
+    return "start", 204, None
+
+
+def _kill(server, query, body, ref):
+    container = server.find(ref)
+    if container is None:
+        return ("kill",) + _not_found(ref)
+    container.stop()
+    return "kill", 204, None
+
+
+def _stop(server, query, body, ref):
+    container = server.find(ref)
+    if container is None:
+        return ("stop",) + _not_found(ref)
+    container.stop()
+    return "stop", 204, None
+
+
+def _rename(server, query, body, ref):
+    container = server.find(ref)
+    if container is None:
+        return ("rename",) + _not_found(ref)
+    container.name = query["name"][0]
+    return "rename", 204, None
+
+
+def _remove(server, query, body, ref):
+    container = server.find(ref)
+    if container is None:
+        return ("remove",) + _not_found(ref)
+    container.stop()
+    with server.lock:
+        server.containers.pop(container.id, None)
+    return "remove", 204, None
+
+
+_ROUTES = {
+    "GET": [
+        (r"/version", _version),
+        (r"/_ping", _version),
+        (r"/containers/json", _list),
+        (r"/containers/([^/]+)/json", _inspect),
+        (r"/images/(.+)/json", _image),
+    ],
+    "POST": [
+        (r"/containers/create", _create),
+        (r"/containers/([^/]+)/start", _start),
+        (r"/containers/([^/]+)/kill", _kill),
+        (r"/containers/([^/]+)/stop", _stop),
+        (r"/containers/([^/]+)/rename", _rename),
+    ],
+    "DELETE": [(r"/containers/([^/]+)", _remove)],
+}
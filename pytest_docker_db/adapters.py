@@ -0,0 +1,353 @@
+# -*- coding: utf-8 -*-
+"""
+Adapters that talk to the database through a Python DB-API driver.
+
+The drivers are optional dependencies, they are only imported when an
+adapter is used:
+
+- postgres: ``psycopg`` (version 3) or ``psycopg2``, asyncio: ``psycopg``
+- MySQL: ``pymysql``, asyncio: ``aiomysql``
+"""
+
+import importlib
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+from urllib.parse import unquote, urlparse
+
+import pytest_docker_db.util as utils
+
+#: a table's row count and the last value of its sequence/auto increment
+TableState = Tuple[int, Optional[int]]
+
+#: the table that holds the checksum of the loaded seed data
+SEED_TABLE = "pytest_docker_db_seed"
+
+
+class AdapterError(Exception):
+    """Raised when an adapter can't be used."""
+
+
+class Adapter:
+    """
+    Base class for a database adapter.
+
+    :param dsn: the connection URL, see the ``docker_db_dsn`` fixture.
+    """
+
+    engine: str = ""
+    drivers: Sequence[str] = ()
+    async_drivers: Sequence[str] = ()
+
+    def __init__(self, dsn: str):
+        self.dsn = dsn
+
+    def driver(self):
+        """Imports the first driver that is installed."""
+        return self._import(self.drivers)
+
+    def async_driver(self):
+        """Imports the first asyncio driver that is installed."""
+        if not self.async_drivers:
+            raise AdapterError(
+                f"There is no asyncio driver for {self.engine}."
+            )
+        return self._import(self.async_drivers)
+
+    def connect(self):
+        """Returns a new DB-API connection that is not in autocommit."""
+        raise NotImplementedError
+
+    async def async_connect(self):
+        """
+        Returns a new connection of the asyncio driver that is not in
+        autocommit.
+        """
+        raise AdapterError(f"There is no asyncio driver for {self.engine}.")
+
+    def set_autocommit(self, conn, autocommit: bool) -> None:
+        conn.autocommit = autocommit
+
+    def seed_connect(self):
+        """Returns a new connection that can load seed data."""
+        return self.connect()
+
+    def quote(self, name: str) -> str:
+        """Quotes an identifier, ``schema.table`` is quoted part by part."""
+        parts = (p.replace('"', '""') for p in name.split("."))
+        return ".".join(f'"{p}"' for p in parts)
+
+    def load_csv(
+        self, conn, table: str, columns: Sequence[str], path: str
+    ) -> None:
+        """
+        Bulk loads the CSV file at ``path``, its first line is the header.
+
+        :param table: the quoted table name.
+        :param columns: the quoted names of the columns in the file.
+        """
+        raise NotImplementedError
+
+    def execute_script(self, conn, sql: str) -> None:
+        """Runs the statements of a SQL script."""
+        self._execute(conn, sql)
+
+    def seed_checksum(self, conn) -> Optional[str]:
+        """The checksum of the seed data that was loaded, if any."""
+        self._execute(
+            conn,
+            f"CREATE TABLE IF NOT EXISTS {SEED_TABLE} "
+            f"(checksum VARCHAR(64) NOT NULL)",
+        )
+        rows = self._fetchall(conn, f"SELECT checksum FROM {SEED_TABLE}")
+        return rows[0][0] if rows else None
+
+    def set_seed_checksum(self, conn, checksum: str) -> None:
+        # the checksum is a hex digest, it is safe to inline
+        self._execute(
+            conn,
+            f"DELETE FROM {SEED_TABLE}",
+            f"INSERT INTO {SEED_TABLE} (checksum) VALUES ('{checksum}')",
+        )
+
+    def _import(self, names: Sequence[str]):
+        for name in names:
+            try:
+                return importlib.import_module(name)
+            except ImportError:
+                continue
+        raise AdapterError(
+            f"One of {', '.join(names)} must be installed to "
+            f"connect to {self.engine}."
+        )
+
+    def snapshot(self, conn) -> Dict[str, TableState]:
+        """
+        Returns the state of every table.
+
+        Comparing two snapshots tells which tables were written to, the
+        sequence value catches rows that were inserted and deleted again.
+        """
+        raise NotImplementedError
+
+    def truncate(self, conn, tables: Sequence[str]) -> None:
+        raise NotImplementedError
+
+    @staticmethod
+    def changed_tables(
+        before: Dict[str, TableState], after: Dict[str, TableState]
+    ) -> List[str]:
+        """The tables that were created or changed between two snapshots."""
+        return sorted(t for t, s in after.items() if before.get(t) != s)
+
+    def _fetchall(self, conn, sql: str) -> List[Tuple[Any, ...]]:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(sql)
+            return list(cursor.fetchall())
+        finally:
+            cursor.close()
+
+    def _execute(self, conn, *statements: str) -> None:
+        cursor = conn.cursor()
+        try:
+            for sql in statements:
+                cursor.execute(sql)
+        finally:
+            cursor.close()
+
+    def _row_counts(self, conn, tables: Sequence[str]) -> Dict[str, int]:
+        if not tables:
+            return {}
+        # one round trip for all of the tables
+        sql = " UNION ALL ".join(
+            f"SELECT '{t}', COUNT(*) FROM {t}" for t in tables
+        )
+        return {t: count for t, count in self._fetchall(conn, sql)}
+
+
+class PostgresAdapter(Adapter):
+    engine = "postgres"
+    drivers = ("psycopg", "psycopg2")
+    async_drivers = ("psycopg",)
+
+    def connect(self):
+        return self.driver().connect(self.dsn)
+
+    async def async_connect(self):
+        psycopg = self.async_driver()
+        return await psycopg.AsyncConnection.connect(self.dsn)
+
+    def load_csv(
+        self, conn, table: str, columns: Sequence[str], path: str
+    ) -> None:
+        sql = (
+            f"COPY {table} ({', '.join(columns)}) FROM STDIN "
+            f"WITH (FORMAT csv, HEADER true)"
+        )
+        cursor = conn.cursor()
+        try:
+            if hasattr(cursor, "copy"):
+                # psycopg 3
+                with cursor.copy(sql) as copy:
+                    for chunk in utils.read_chunks(path):
+                        copy.write(chunk)
+            else:
+                cursor.copy_expert(sql, _ChunkReader(utils.read_chunks(path)))
+        finally:
+            cursor.close()
+
+    def snapshot(self, conn) -> Dict[str, TableState]:
+        # regclass::text quotes and schema qualifies the names as needed
+        tables = [
+            t
+            for t, in self._fetchall(
+                conn,
+                "SELECT c.oid::regclass::text FROM pg_class c "
+                "JOIN pg_namespace n ON n.oid = c.relnamespace "
+                "WHERE c.relkind IN ('r', 'p') AND n.nspname NOT IN "
+                "('pg_catalog', 'information_schema') "
+                "AND n.nspname NOT LIKE 'pg_toast%'",
+            )
+        ]
+        sequences = dict(
+            self._fetchall(
+                conn,
+                "SELECT t.oid::regclass::text, s.last_value FROM pg_class t "
+                "JOIN pg_depend d ON d.refobjid = t.oid "
+                "AND d.deptype IN ('a', 'i') "
+                "JOIN pg_class sc ON sc.oid = d.objid AND sc.relkind = 'S' "
+                "JOIN pg_sequences s ON s.schemaname = "
+                "sc.relnamespace::regnamespace::text "
+                "AND s.sequencename = sc.relname",
+            )
+        )
+        counts = self._row_counts(conn, tables)
+        return {t: (counts[t], sequences.get(t)) for t in tables}
+
+    def truncate(self, conn, tables: Sequence[str]) -> None:
+        if tables:
+            self._execute(
+                conn, f"TRUNCATE {', '.join(tables)} RESTART IDENTITY CASCADE"
+            )
+
+
+class MySQLAdapter(Adapter):
+    engine = "mysql"
+    drivers = ("pymysql",)
+    async_drivers = ("aiomysql",)
+
+    def connect(self):
+        return self.driver().connect(**self._params(), autocommit=False)
+
+    async def async_connect(self):
+        params = self._params()
+        params["db"] = params.pop("database")
+        return await self.async_driver().connect(**params, autocommit=False)
+
+    def seed_connect(self):
+        constants = importlib.import_module(
+            f"{self.driver().__name__}.constants.CLIENT"
+        )
+        conn = self.driver().connect(
+            **self._params(),
+            autocommit=False,
+            local_infile=True,
+            client_flag=constants.MULTI_STATEMENTS,
+        )
+        try:
+            # MySQL 8 does not allow LOAD DATA LOCAL by default
+            self._execute(conn, "SET GLOBAL local_infile = 1")
+        except Exception:
+            pass
+        return conn
+
+    def quote(self, name: str) -> str:
+        parts = (p.replace("`", "``") for p in name.split("."))
+        return ".".join(f"`{p}`" for p in parts)
+
+    def load_csv(
+        self, conn, table: str, columns: Sequence[str], path: str
+    ) -> None:
+        # the driver sends the file in chunks when the server asks for it
+        cursor = conn.cursor()
+        try:
+            cursor.execute(
+                f"LOAD DATA LOCAL INFILE %s INTO TABLE {table} "
+                f"CHARACTER SET utf8mb4 "
+                f"FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' "
+                f"ESCAPED BY '' LINES TERMINATED BY '\\n' IGNORE 1 LINES "
+                f"({', '.join(columns)})",
+                (path,),
+            )
+        finally:
+            cursor.close()
+
+    def execute_script(self, conn, sql: str) -> None:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(sql)
+            # every statement has its own result
+            while cursor.nextset():
+                pass
+        finally:
+            cursor.close()
+
+    def _params(self) -> Dict[str, Any]:
+        url = urlparse(self.dsn)
+        return {
+            "host": url.hostname,
+            "port": url.port or 3306,
+            "user": unquote(url.username or "root"),
+            "password": unquote(url.password or ""),
+            "database": url.path.lstrip("/") or None,
+        }
+
+    def set_autocommit(self, conn, autocommit: bool) -> None:
+        conn.autocommit(autocommit)
+
+    def snapshot(self, conn) -> Dict[str, TableState]:
+        try:
+            # MySQL 8 caches the table statistics, including AUTO_INCREMENT
+            self._execute(
+                conn, "SET SESSION information_schema_stats_expiry=0"
+            )
+        except Exception:
+            pass
+        rows = self._fetchall(
+            conn,
+            "SELECT table_name, auto_increment FROM information_schema.tables "
+            "WHERE table_schema = DATABASE() AND table_type = 'BASE TABLE'",
+        )
+        increments = {f"`{t}`": inc for t, inc in rows}
+        counts = self._row_counts(conn, list(increments))
+        return {t: (counts[t], inc) for t, inc in increments.items()}
+
+    def truncate(self, conn, tables: Sequence[str]) -> None:
+        if tables:
+            self._execute(
+                conn,
+                "SET FOREIGN_KEY_CHECKS=0",
+                *(f"TRUNCATE TABLE {t}" for t in tables),
+                "SET FOREIGN_KEY_CHECKS=1",
+            )
+
+
+class _ChunkReader:
+    """A file-like object over chunks, for psycopg2's ``copy_expert``."""
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self._chunks = iter(chunks)
+        self._buffer = memoryview(b"")
+
+    def read(self, size: int = -1) -> bytes:
+        while not self._buffer:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return b""
+            self._buffer = memoryview(chunk)
+        if size < 0:
+            size = len(self._buffer)
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return bytes(data)
+
+
+ADAPTERS = {"postgres": PostgresAdapter, "mysql": MySQLAdapter}
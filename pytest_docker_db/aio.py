@@ -0,0 +1,484 @@
+# -*- coding: utf-8 -*-
+"""
+A minimal asyncio client for the Docker Engine API.
+
+docker-py blocks, every call to it from a coroutine stalls the event loop
+that the other fixtures and tests share. This client speaks just enough
+HTTP/1.1 over the daemon's Unix socket, or a ``tcp://`` ``DOCKER_HOST``, to
+run, probe and remove database containers without blocking. Every request
+uses its own connection, so any number of them can run concurrently.
+
+TLS and Windows named pipes are not supported.
+"""
+
+import asyncio
+import json
+import os
+import re
+import struct
+import time
+from typing import (
+    Any,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    TYPE_CHECKING,
+    Union,
+)
+from urllib.parse import quote, urlencode, urlparse
+
+import pytest_docker_db.readiness as readiness
+
+if TYPE_CHECKING:
+    from asyncio import StreamReader
+
+DEFAULT_HOST = "unix:///var/run/docker.sock"
+
+
+class AsyncDockerError(Exception):
+    """An error response of the daemon."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(f"{status} {message}")
+        self.status = status
+        self.message = message
+
+    @property
+    def not_found(self) -> bool:
+        return self.status == 404
+
+
+class AsyncDockerClient:
+    """
+    :param base_url: where the daemon listens, e.g. ``DOCKER_HOST``.
+    :param timeout: how many seconds a request may take.
+    """
+
+    def __init__(self, base_url: str = DEFAULT_HOST, timeout: float = 60.0):
+        url = urlparse(base_url)
+        self.base_url = base_url
+        self.timeout = timeout
+        self._unix_socket: Optional[str] = None
+        self._address: Optional[Tuple[str, int]] = None
+        if url.scheme in ("unix", "http+unix"):
+            self._unix_socket = url.path
+        elif url.scheme in ("tcp", "http"):
+            self._address = (url.hostname or "localhost", url.port or 2375)
+        else:
+            raise AsyncDockerError(
+                0, f"Unsupported docker host {base_url}, use unix:// or tcp://"
+            )
+
+    @classmethod
+    def from_env(cls) -> "AsyncDockerClient":
+        """Connects to ``DOCKER_HOST``, like ``docker.from_env()``."""
+        if os.environ.get("DOCKER_TLS_VERIFY"):
+            raise AsyncDockerError(0, "TLS connections are not supported")
+        return cls(os.environ.get("DOCKER_HOST") or DEFAULT_HOST)
+
+    async def request(
+        self,
+        method: str,
+        path: str,
+        params: Optional[Dict[str, Any]] = None,
+        body: Any = None,
+        timeout: Optional[float] = None,
+    ) -> Union[Any, bytes]:
+        """
+        Sends a request to the daemon.
+
+        :return: the decoded JSON response, or the raw bytes if the response
+            is not JSON.
+        :raises AsyncDockerError: if the daemon responds with an error.
+        """
+        if self._unix_socket is not None:
+            reader, writer = await asyncio.open_unix_connection(
+                self._unix_socket
+            )
+        else:
+            reader, writer = await asyncio.open_connection(*self._address)
+        try:
+            query = f"?{urlencode(params)}" if params else ""
+            data = b"" if body is None else json.dumps(body).encode("utf-8")
+            head = (
+                f"{method} {path}{query} HTTP/1.1\r\n"
+                f"Host: docker\r\n"
+                f"Connection: close\r\n"
+                f"Content-Type: application/json\r\n"
+                f"Content-Length: {len(data)}\r\n\r\n"
+            )
+            writer.write(head.encode("latin-1") + data)
+            await writer.drain()
+            status, headers, payload = await asyncio.wait_for(
+                _read_response(reader), timeout or self.timeout
+            )
+        finally:
+            writer.close()
+
+        content = payload
+        if "json" in headers.get("content-type", "") and payload:
+            try:
+                content = json.loads(payload)
+            except ValueError:
+                # e.g. the progress stream of a pull, one object per line
+                pass
+        if status >= 400:
+            message = payload.decode("utf-8", errors="replace")
+            if isinstance(content, dict):
+                message = content.get("message", message)
+            raise AsyncDockerError(status, message)
+        return content
+
+    async def ping(self) -> None:
+        await self.request("GET", "/_ping")
+
+    async def image_exists(self, name: str) -> bool:
+        try:
+            await self.request("GET", f"/images/{quote(name, safe='')}/json")
+        except AsyncDockerError as e:
+            if e.not_found:
+                return False
+            raise
+        return True
+
+    async def pull(self, image: str) -> None:
+        """Pulls the image, waiting until it is complete."""
+        repository, tag = _split_image(image)
+        payload = await self.request(
+            "POST",
+            "/images/create",
+            params={"fromImage": repository, "tag": tag},
+            timeout=3600,
+        )
+        # errors during the pull are reported in the progress stream
+        if isinstance(payload, (bytes, bytearray)):
+            lines = payload.decode("utf-8", errors="replace").splitlines()
+            for line in lines:
+                try:
+                    progress = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(progress, dict) and "error" in progress:
+                    raise AsyncDockerError(500, progress["error"])
+
+    async def containers(
+        self, filters: Optional[Dict[str, List[str]]] = None
+    ) -> List[Dict[str, Any]]:
+        """Lists all containers, including stopped ones."""
+        params = {"all": "1"}
+        if filters:
+            params["filters"] = json.dumps(filters)
+        return await self.request("GET", "/containers/json", params=params)
+
+    async def create(self, name: str, config: Dict[str, Any]) -> str:
+        """Creates a container and returns its ID."""
+        response = await self.request(
+            "POST", "/containers/create", params={"name": name}, body=config
+        )
+        return response["Id"]
+
+    async def inspect(self, container_id: str) -> Dict[str, Any]:
+        return await self.request("GET", f"/containers/{container_id}/json")
+
+    async def start(self, container_id: str) -> None:
+        await self.request("POST", f"/containers/{container_id}/start")
+
+    async def kill(self, container_id: str, signal: str = "SIGKILL") -> None:
+        await self.request(
+            "POST",
+            f"/containers/{container_id}/kill",
+            params={"signal": signal},
+        )
+
+    async def stop(self, container_id: str, timeout: float = 10) -> None:
+        await self.request(
+            "POST",
+            f"/containers/{container_id}/stop",
+            params={"t": int(timeout)},
+            timeout=self.timeout + timeout,
+        )
+
+    async def rename(self, container_id: str, name: str) -> None:
+        await self.request(
+            "POST",
+            f"/containers/{container_id}/rename",
+            params={"name": name},
+        )
+
+    async def remove(self, container_id: str) -> None:
+        """Removes the container with its anonymous volumes."""
+        await self.request(
+            "DELETE",
+            f"/containers/{container_id}",
+            params={"v": "1", "force": "1"},
+        )
+
+    async def logs(self, container_id: str, tail: str = "all") -> str:
+        payload = await self.request(
+            "GET",
+            f"/containers/{container_id}/logs",
+            params={"stdout": "1", "stderr": "1", "tail": tail},
+        )
+        return _demux(payload).decode("utf-8", errors="replace")
+
+    async def exec(self, container_id: str, cmd: Sequence[str]) -> int:
+        """Runs ``cmd`` in the container and returns its exit code."""
+        response = await self.request(
+            "POST",
+            f"/containers/{container_id}/exec",
+            body={"Cmd": list(cmd), "AttachStdout": True},
+        )
+        exec_id = response["Id"]
+        # without Detach the daemon answers once the command has exited
+        await self.request(
+            "POST", f"/exec/{exec_id}/start", body={"Detach": False}
+        )
+        while True:
+            state = await self.request("GET", f"/exec/{exec_id}/json")
+            if not state.get("Running"):
+                return state.get("ExitCode") or 0
+            await asyncio.sleep(0.05)
+
+
+class Container:
+    """
+    A container and the attrs it was last inspected with, like docker-py's
+    `Container`.
+    """
+
+    def __init__(self, client: AsyncDockerClient, attrs: Dict[str, Any]):
+        self.client = client
+        self.attrs = attrs
+
+    @property
+    def id(self) -> str:
+        return self.attrs["Id"]
+
+    @property
+    def name(self) -> str:
+        return self.attrs.get("Name", "").lstrip("/")
+
+    @property
+    def status(self) -> str:
+        return self.attrs.get("State", {}).get("Status", "")
+
+    async def reload(self) -> None:
+        self.attrs = await self.client.inspect(self.id)
+
+    def __repr__(self):
+        return f"<Container: {self.id[:12]}>"
+
+
+class TcpProbe:
+    """The asyncio version of :class:`readiness.TcpProbe`."""
+
+    def __init__(
+        self, host: str, container_port: str, read_timeout: float = 0.2
+    ):
+        self.host = host
+        self.container_port = container_port
+        self.read_timeout = read_timeout
+
+    def describe(self) -> str:
+        return f"TcpProbe({self.host}, {self.container_port})"
+
+    async def check(self, container: Container) -> bool:
+        port = readiness.published_port(container, self.container_port)
+        if port is None:
+            return False
+        try:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(self.host, int(port)), timeout=1
+            )
+        except (OSError, asyncio.TimeoutError):
+            return False
+        try:
+            data = await asyncio.wait_for(reader.read(1), self.read_timeout)
+            return data != b""
+        except asyncio.TimeoutError:
+            return True
+        except OSError:
+            return False
+        finally:
+            writer.close()
+
+
+class LogProbe:
+    """The asyncio version of :class:`readiness.LogProbe`."""
+
+    def __init__(self, pattern: str, occurrences: int = 1):
+        self.pattern = re.compile(pattern, re.MULTILINE)
+        self.occurrences = occurrences
+
+    def describe(self) -> str:
+        return f"LogProbe({self.pattern.pattern!r})"
+
+    async def check(self, container: Container) -> bool:
+        try:
+            logs = await container.client.logs(container.id)
+        except AsyncDockerError:
+            return False
+        return len(self.pattern.findall(logs)) >= self.occurrences
+
+
+class ExecProbe:
+    """The asyncio version of :class:`readiness.ExecProbe`."""
+
+    def __init__(self, cmd: Union[str, Sequence[str]]):
+        self.cmd = ["sh", "-c", cmd] if isinstance(cmd, str) else list(cmd)
+
+    def describe(self) -> str:
+        return f"ExecProbe({self.cmd!r})"
+
+    async def check(self, container: Container) -> bool:
+        try:
+            return await container.client.exec(container.id, self.cmd) == 0
+        except AsyncDockerError:
+            return False
+
+
+class HealthcheckProbe:
+    """The asyncio version of :class:`readiness.HealthcheckProbe`."""
+
+    def describe(self) -> str:
+        return "HealthcheckProbe()"
+
+    async def check(self, container: Container) -> bool:
+        health = container.attrs.get("State", {}).get("Health") or {}
+        return health.get("Status") == "healthy"
+
+
+def default_probes(
+    container: Container,
+    host: str,
+    container_port: Optional[str],
+    log_pattern: Optional[str] = None,
+    cmd: Optional[str] = None,
+) -> list:
+    """The same probes as :func:`readiness.default_probes`."""
+    probes: list = []
+    if container_port is not None:
+        probes.append(TcpProbe(host, container_port))
+    if log_pattern is not None:
+        probes.append(LogProbe(log_pattern))
+    if cmd is not None:
+        probes.append(ExecProbe(cmd))
+    if container.attrs.get("Config", {}).get("Healthcheck", {}).get("Test"):
+        probes.append(HealthcheckProbe())
+    return probes
+
+
+async def wait_until_ready(
+    container: Container,
+    probes: Sequence[Any],
+    timeout: float,
+    initial_delay: float = 0.05,
+    max_delay: float = 1.0,
+) -> None:
+    """
+    The asyncio version of :func:`readiness.wait_until_ready`, the probes
+    of one poll run concurrently.
+
+    :raises readiness.ReadinessError: if the deadline passes or the
+        container stops.
+    """
+    deadline = time.monotonic() + timeout
+    pending = list(probes)
+    delay = initial_delay
+
+    while True:
+        await container.reload()
+        if container.status in ("exited", "dead"):
+            raise readiness.ReadinessError(
+                f"Container {container.name} stopped with status "
+                f"{container.status!r} before it was ready."
+                f"\n{await _tail_logs(container)}"
+            )
+
+        results = await asyncio.gather(*(p.check(container) for p in pending))
+        pending = [p for p, ready in zip(pending, results) if not ready]
+        if not pending:
+            return
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise readiness.ReadinessError(
+                f"Container {container.name} was not ready after {timeout}s. "
+                f"Waiting on: {', '.join(p.describe() for p in pending)}"
+                f"\n{await _tail_logs(container)}"
+            )
+        await asyncio.sleep(min(delay, remaining))
+        delay = min(delay * 2, max_delay)
+
+
+async def _tail_logs(container: Container, lines: int = 20) -> str:
+    try:
+        return await container.client.logs(container.id, tail=str(lines))
+    except AsyncDockerError:
+        return ""
+
+
+async def _read_response(
+    reader: "StreamReader",
+) -> Tuple[int, Dict[str, str], bytes]:
+    status_line = await reader.readline()
+    if not status_line:
+        raise AsyncDockerError(0, "The daemon closed the connection")
+    status = int(status_line.split()[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        key, _, value = line.decode("latin-1").partition(":")
+        headers[key.strip().lower()] = value.strip()
+
+    if status in (204, 304):
+        return status, headers, b""
+    if headers.get("transfer-encoding", "").lower() == "chunked":
+        chunks = []
+        while True:
+            size = int((await reader.readline()).split(b";")[0], 16)
+            if size == 0:
+                await reader.readline()
+                break
+            chunks.append(await reader.readexactly(size))
+            await reader.readline()
+        return status, headers, b"".join(chunks)
+    if "content-length" in headers:
+        length = int(headers["content-length"])
+        return status, headers, await reader.readexactly(length)
+    return status, headers, await reader.read()
+
+
+def _demux(payload: Any) -> bytes:
+    """
+    Strips the headers the daemon puts in front of every frame of the
+    output of a container without a TTY.
+    """
+    if not isinstance(payload, (bytes, bytearray)):
+        return str(payload).encode("utf-8")
+    frames = []
+    start = 0
+    while start + 8 <= len(payload) and payload[start] in (0, 1, 2):
+        _, size = struct.unpack_from(">BxxxL", payload, start)
+        start, end = start + 8, start + 8 + size
+        frames.append(payload[start:end])
+        start = end
+    if start == 0:
+        return bytes(payload)
+    return b"".join(frames)
+
+
+def _split_image(image: str) -> Tuple[str, str]:
+    """Splits ``image`` into the repository and the tag or digest."""
+    if "@" in image:
+        repository, _, digest = image.partition("@")
+        return repository, digest
+    name = image.rsplit("/", 1)[-1]
+    if ":" in name:
+        repository, _, tag = image.rpartition(":")
+        return repository, tag
+    return image, "latest"
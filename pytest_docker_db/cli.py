@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""
+The ``pytest-docker-db`` command.
+"""
+
+import argparse
+import logging
+import signal
+import sys
+from typing import List, Optional
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="pytest-docker-db",
+        description="Tools for the pytest-docker-db plugin.",
+    )
+    commands = parser.add_subparsers(dest="command")
+    commands.required = True
+
+    pool = commands.add_parser(
+        "pool",
+        help="Keep a pool of ready database containers that pytest sessions "
+        "lease with --db-pool.",
+    )
+    pool.add_argument(
+        "--socket", required=True, help="The Unix socket to listen on."
+    )
+    pool.add_argument("--image", required=True, help="The image to start.")
+    pool.add_argument(
+        "--port", default=None, help="The port of the database in the image."
+    )
+    pool.add_argument(
+        "--env",
+        action="append",
+        default=None,
+        help="An environment variable, KEY=VALUE. Can be repeated.",
+    )
+    pool.add_argument(
+        "--size",
+        type=int,
+        default=2,
+        help="How many ready containers to keep. Defaults to 2.",
+    )
+    pool.add_argument("--ready-timeout", type=float, default=60.0)
+    pool.add_argument("--ready-log", default=None)
+    pool.add_argument("--ready-cmd", default=None)
+    pool.set_defaults(func=_pool)
+
+    cleanup = commands.add_parser(
+        "cleanup",
+        help="Remove every container and volume created by the plugin, "
+        "e.g. the ones left behind by sessions that crashed.",
+    )
+    cleanup.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Only list what would be removed.",
+    )
+    cleanup.set_defaults(func=_cleanup)
+
+    gc = commands.add_parser(
+        "gc",
+        help="Remove the containers whose pytest session is gone or that "
+        "are older than --ttl.",
+    )
+    gc.add_argument(
+        "--ttl",
+        type=float,
+        default=86400.0,
+        help="The age in seconds after which containers are removed. "
+        "Defaults to 86400, 0 disables it.",
+    )
+    gc.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Only list what would be removed.",
+    )
+    gc.set_defaults(func=_gc)
+
+    reap = commands.add_parser(
+        "reap",
+        help="Stop and remove containers, used by --db-teardown=background.",
+    )
+    reap.add_argument("container_ids", nargs="+", metavar="CONTAINER")
+    reap.add_argument(
+        "--timeout",
+        type=float,
+        default=10.0,
+        help="How many seconds the containers get to stop.",
+    )
+    reap.set_defaults(func=_reap)
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s"
+    )
+    return args.func(args)
+
+
+def _pool(args: argparse.Namespace) -> int:
+    import docker
+
+    from pytest_docker_db.pool import ContainerPool, serve
+
+    container_pool = ContainerPool(
+        docker.from_env(),
+        image=args.image,
+        port=args.port,
+        env_vars=args.env,
+        size=args.size,
+        ready_timeout=args.ready_timeout,
+        ready_log=args.ready_log,
+        ready_cmd=args.ready_cmd,
+    )
+    # turn SIGTERM into an exception so the containers are removed
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    logging.info("Serving a pool of %s on %s", args.image, args.socket)
+    try:
+        serve(args.socket, container_pool)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def _cleanup(args: argparse.Namespace) -> int:
+    import docker
+
+    from pytest_docker_db.reaper import cleanup
+
+    removed = cleanup(docker.from_env(), dry_run=args.dry_run)
+    verb = "Would remove" if args.dry_run else "Removed"
+    for kind, names in removed.items():
+        logging.info("%s %d %s", verb, len(names), kind)
+        for name in names:
+            print(name)
+    return 0
+
+
+def _gc(args: argparse.Namespace) -> int:
+    import docker
+
+    from pytest_docker_db.reaper import collect
+
+    leaked = collect(docker.from_env(), ttl=args.ttl, dry_run=args.dry_run)
+    verb = "Would remove" if args.dry_run else "Removed"
+    logging.info("%s %d leaked containers", verb, len(leaked))
+    for container_id in leaked:
+        print(container_id)
+    return 0
+
+
+def _reap(args: argparse.Namespace) -> int:
+    import docker
+
+    from pytest_docker_db.reaper import reap
+
+    reap(docker.from_env(), args.container_ids, args.timeout)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,349 @@
+# -*- coding: utf-8 -*-
+"""
+Pools of open connections to the database.
+
+Connecting, and authenticating, costs a few milliseconds on every test that
+opens its own connection. The pools open their connections once, hand them
+out to the tests and roll them back when they are returned.
+
+How long it took to get a connection from a pool is recorded as the
+``pool_wait`` phase of the session's timings.
+"""
+
+import asyncio
+import inspect
+import logging
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Iterator,
+    List,
+    Optional,
+    TYPE_CHECKING,
+)
+
+if TYPE_CHECKING:
+    from pytest_docker_db.timing import Timings
+
+log = logging.getLogger(__name__)
+
+
+class ConnectionPoolError(Exception):
+    """Raised when a pool has no connection to hand out."""
+
+
+class ConnectionPool:
+    """
+    A thread safe pool of up to ``size`` DB-API connections.
+
+    :param connect: opens a new connection.
+    :param size: the most connections that are open at the same time.
+    :param timeout: how many seconds :meth:`acquire` waits for a connection
+        when all of them are in use.
+    :param reset: undoes what the last user of a connection did, it is
+        rolled back by default. A connection is closed if this raises.
+    :param timings: where the ``pool_wait`` phase is recorded.
+    :param target: the target of the recorded phases, e.g. the container.
+    """
+
+    def __init__(
+        self,
+        connect: Callable[[], Any],
+        size: int = 4,
+        timeout: float = 30.0,
+        reset: Optional[Callable[[Any], None]] = None,
+        timings: Optional["Timings"] = None,
+        target: Optional[str] = None,
+    ):
+        self.size = size
+        self.timeout = timeout
+        self.timings = timings
+        self.target = target
+        self._connect = connect
+        self._reset = reset or (lambda conn: conn.rollback())
+        # the connection that was returned last is the warmest one
+        self._idle: "queue.LifoQueue[Any]" = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._opened = 0
+        self._closed = False
+
+    @property
+    def idle(self) -> int:
+        """How many connections are open and not in use."""
+        return self._idle.qsize()
+
+    def prewarm(self) -> None:
+        """Opens all of the connections that aren't open yet, concurrently."""
+        with self._lock:
+            missing = self.size - self._opened
+            self._opened += max(missing, 0)
+        if missing <= 0:
+            return
+
+        with ThreadPoolExecutor(max_workers=missing) as pool:
+            futures = [pool.submit(self._connect) for _ in range(missing)]
+        errors = []
+        for future in futures:
+            try:
+                self._idle.put(future.result())
+            except Exception as e:
+                errors.append(e)
+        if errors:
+            with self._lock:
+                self._opened -= len(errors)
+            raise errors[0]
+
+    def acquire(self, timeout: Optional[float] = None) -> Any:
+        """
+        Returns an idle connection, opens a new one if there is none or
+        waits for one to be released if all ``size`` connections are in
+        use.
+
+        :raises ConnectionPoolError: if no connection was released in time.
+        """
+        if self._closed:
+            raise ConnectionPoolError("The connection pool is closed.")
+        with self._phase():
+            try:
+                return self._idle.get_nowait()
+            except queue.Empty:
+                pass
+
+            with self._lock:
+                can_open = self._opened < self.size
+                if can_open:
+                    self._opened += 1
+            if can_open:
+                try:
+                    return self._connect()
+                except BaseException:
+                    with self._lock:
+                        self._opened -= 1
+                    raise
+
+            timeout = self.timeout if timeout is None else timeout
+            try:
+                return self._idle.get(timeout=timeout)
+            except queue.Empty:
+                raise ConnectionPoolError(
+                    f"All {self.size} connections were in use for "
+                    f"{timeout}s."
+                ) from None
+
+    def release(self, conn: Any) -> None:
+        """Resets the connection and makes it available again."""
+        if not self._closed:
+            try:
+                self._reset(conn)
+            except Exception as e:
+                log.debug("Dropping a connection that can't be reset: %s", e)
+            else:
+                self._idle.put(conn)
+                return
+        with self._lock:
+            self._opened -= 1
+        _close(conn)
+
+    @contextmanager
+    def connection(self, timeout: Optional[float] = None) -> Iterator[Any]:
+        """Acquires a connection for the duration of the block."""
+        conn = self.acquire(timeout)
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self) -> None:
+        """
+        Closes the idle connections, connections that are in use are closed
+        when they are released.
+        """
+        self._closed = True
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            with self._lock:
+                self._opened -= 1
+            _close(conn)
+
+    def _phase(self):
+        if self.timings is None:
+            return _nothing()
+        return self.timings.phase("pool_wait", self.target)
+
+
+class AsyncConnectionPool:
+    """
+    The asyncio version of :class:`ConnectionPool`, it is not thread safe.
+
+    Connections are bound to the event loop they were opened in. When the
+    pool is used from another event loop, e.g. because every test runs in
+    its own loop, the connections of the previous loop are dropped. Run the
+    tests in one loop to keep the connections open across tests.
+
+    :param connect: a coroutine function that opens a new connection.
+    :param reset: a coroutine function, ``await conn.rollback()`` by
+        default.
+    """
+
+    def __init__(
+        self,
+        connect: Callable[[], Awaitable[Any]],
+        size: int = 4,
+        timeout: float = 30.0,
+        reset: Optional[Callable[[Any], Awaitable[None]]] = None,
+        timings: Optional["Timings"] = None,
+        target: Optional[str] = None,
+    ):
+        self.size = size
+        self.timeout = timeout
+        self.timings = timings
+        self.target = target
+        self._connect = connect
+        self._reset = reset or _rollback
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._idle: Optional["asyncio.LifoQueue[Any]"] = None
+        self._opened = 0
+        self._closed = False
+
+    @property
+    def idle(self) -> int:
+        return self._idle.qsize() if self._idle is not None else 0
+
+    async def prewarm(self) -> None:
+        idle = self._bind()
+        missing = self.size - self._opened
+        if missing <= 0:
+            return
+        self._opened += missing
+        results = await asyncio.gather(
+            *(self._connect() for _ in range(missing)), return_exceptions=True
+        )
+        errors: List[BaseException] = []
+        for result in results:
+            if isinstance(result, BaseException):
+                errors.append(result)
+            else:
+                idle.put_nowait(result)
+        if errors:
+            self._opened -= len(errors)
+            raise errors[0]
+
+    async def acquire(self, timeout: Optional[float] = None) -> Any:
+        """See :meth:`ConnectionPool.acquire`."""
+        if self._closed:
+            raise ConnectionPoolError("The connection pool is closed.")
+        idle = self._bind()
+        with self._phase():
+            if not idle.empty():
+                return idle.get_nowait()
+
+            if self._opened < self.size:
+                self._opened += 1
+                try:
+                    return await self._connect()
+                except BaseException:
+                    self._opened -= 1
+                    raise
+
+            timeout = self.timeout if timeout is None else timeout
+            try:
+                return await asyncio.wait_for(idle.get(), timeout)
+            except asyncio.TimeoutError:
+                raise ConnectionPoolError(
+                    f"All {self.size} connections were in use for "
+                    f"{timeout}s."
+                ) from None
+
+    async def release(self, conn: Any) -> None:
+        if not self._closed and self._loop is _running_loop():
+            try:
+                await self._reset(conn)
+            except Exception as e:
+                log.debug("Dropping a connection that can't be reset: %s", e)
+            else:
+                self._idle.put_nowait(conn)  # type: ignore
+                return
+            self._opened -= 1
+        await _aclose(conn)
+
+    @asynccontextmanager
+    async def connection(
+        self, timeout: Optional[float] = None
+    ) -> AsyncIterator[Any]:
+        conn = await self.acquire(timeout)
+        try:
+            yield conn
+        finally:
+            await self.release(conn)
+
+    async def aclose(self) -> None:
+        self._closed = True
+        if self._idle is None or self._loop is not _running_loop():
+            self._drop()
+            return
+        while not self._idle.empty():
+            self._opened -= 1
+            await _aclose(self._idle.get_nowait())
+
+    def _bind(self) -> "asyncio.LifoQueue[Any]":
+        loop = _running_loop()
+        if self._idle is None or loop is not self._loop:
+            self._drop()
+            self._loop = loop
+            self._idle = asyncio.LifoQueue()
+        return self._idle
+
+    def _drop(self) -> None:
+        # the connections of another loop can't be closed from this one,
+        # they are closed when they are garbage collected
+        if self.idle:
+            log.debug("Dropping %s connections of another loop", self.idle)
+        self._idle = None
+        self._opened = 0
+
+    def _phase(self):
+        if self.timings is None:
+            return _nothing()
+        return self.timings.phase("pool_wait", self.target)
+
+
+@contextmanager
+def _nothing() -> Iterator[None]:
+    yield
+
+
+def _running_loop() -> Optional[asyncio.AbstractEventLoop]:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+async def _rollback(conn: Any) -> None:
+    await conn.rollback()
+
+
+def _close(conn: Any) -> None:
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+
+async def _aclose(conn: Any) -> None:
+    # e.g. psycopg's close() is a coroutine, aiomysql's is not
+    try:
+        result = conn.close()
+        if inspect.isawaitable(result):
+            await result
+    except Exception:
+        pass
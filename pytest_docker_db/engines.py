@@ -0,0 +1,395 @@
+# -*- coding: utf-8 -*-
+"""
+Knowledge about specific database engines.
+
+Every engine is a profile of the defaults for its official image: the port,
+the environment the image needs to start, how to tell it is ready, how to
+connect to it and how to make it fast for tests. More engines can be added
+with the ``pytest_docker_db_add_engines`` hook.
+
+Everything that is done inside of the database is done by running the
+engine's own command line client in the container with ``exec``, so no
+database drivers have to be installed to use the plugin.
+"""
+
+import shlex
+from typing import Dict, List, Optional, Sequence, TYPE_CHECKING, Type
+
+if TYPE_CHECKING:
+    from docker.models.containers import Container
+
+
+class EngineError(Exception):
+    """Raised when a command run against the database fails."""
+
+
+class Engine:
+    """
+    Base class for a database engine.
+
+    :param env: the environment variables the container was started with.
+    """
+
+    name: str = ""
+    scheme: str = ""
+    #: the repositories of the images the engine is detected from, the last
+    #: component of the image name without the tag, e.g. ``postgis`` for
+    #: ``postgis/postgis:16-3.4``
+    image_hints: Sequence[str] = ()
+    #: the port the database listens on in the container
+    default_port: Optional[str] = None
+    #: arguments for the image's entrypoint that turn off durability
+    no_durability_args: List[str] = []
+
+    def __init__(self, env: Dict[str, str]):
+        self.env = env
+
+    def default_env(self) -> Dict[str, str]:
+        """
+        The environment variables the image needs to start that are
+        missing from ``env``.
+        """
+        return {}
+
+    @property
+    def ready_cmd(self) -> Optional[str]:
+        """A command that exits with 0 once the database is ready."""
+        return None
+
+    @property
+    def user(self) -> str:
+        raise NotImplementedError
+
+    @property
+    def password(self) -> Optional[str]:
+        raise NotImplementedError
+
+    @property
+    def database(self) -> Optional[str]:
+        raise NotImplementedError
+
+    @property
+    def data_dir(self) -> Optional[str]:
+        """The directory in the container the database keeps its data in."""
+        return None
+
+    def clone_database(
+        self, container: "Container", template: str, name: str
+    ) -> None:
+        """Creates the database ``name`` as a copy of ``template``."""
+        raise NotImplementedError
+
+    def drop_database(self, container: "Container", name: str) -> None:
+        raise NotImplementedError
+
+    def flush(self, container: "Container") -> None:
+        """
+        Removes all of the data, e.g. for engines that can't copy their
+        databases.
+        """
+        raise NotImplementedError
+
+    def dsn(self, host: str, port: str, database: Optional[str] = None) -> str:
+        """
+        Builds a connection URL for the database.
+
+        :param database: the database to connect to, defaults to the
+            database created by the image.
+        """
+        database = database or self.database or ""
+        auth = ""
+        if self.user:
+            auth = self.user
+            if self.password:
+                auth = f"{auth}:{self.password}"
+            auth = f"{auth}@"
+        return f"{self.scheme}://{auth}{host}:{port}/{database}"
+
+    def _exec(
+        self,
+        container: "Container",
+        cmd: List[str],
+        environment: Optional[Dict[str, str]] = None,
+    ) -> str:
+        result = container.exec_run(cmd, environment=environment)
+        output = result.output.decode("utf-8", errors="replace")
+        if result.exit_code != 0:
+            raise EngineError(
+                f"Command {cmd!r} failed with exit code "
+                f"{result.exit_code}.\n{output}"
+            )
+        return output
+
+
+class Postgres(Engine):
+    name = "postgres"
+    scheme = "postgresql"
+    image_hints = (
+        "postgres",
+        "postgresql",
+        "postgis",
+        "timescaledb",
+        "timescaledb-ha",
+    )
+    default_port = "5432"
+    no_durability_args = [
+        "-c",
+        "fsync=off",
+        "-c",
+        "synchronous_commit=off",
+        "-c",
+        "full_page_writes=off",
+    ]
+
+    def default_env(self) -> Dict[str, str]:
+        if "POSTGRES_PASSWORD" in self.env:
+            return {}
+        if "POSTGRES_HOST_AUTH_METHOD" in self.env:
+            return {}
+        return {"POSTGRES_PASSWORD": "postgres"}
+
+    @property
+    def ready_cmd(self) -> Optional[str]:
+        # the server the image runs while it initializes the database only
+        # listens on the unix socket
+        return f"pg_isready -h 127.0.0.1 -U {self.user}"
+
+    @property
+    def user(self) -> str:
+        return self.env.get("POSTGRES_USER", "postgres")
+
+    @property
+    def password(self) -> Optional[str]:
+        return self.env.get("POSTGRES_PASSWORD")
+
+    @property
+    def database(self) -> Optional[str]:
+        return self.env.get("POSTGRES_DB", self.user)
+
+    @property
+    def data_dir(self) -> Optional[str]:
+        return self.env.get("PGDATA", "/var/lib/postgresql/data")
+
+    def _psql(self, container: "Container", sql: str, *databases: str) -> str:
+        """
+        Runs ``sql`` connected to a maintenance database that is none of
+        ``databases``, a database can't be dropped or copied while it is
+        the open one.
+        """
+        maintenance = (
+            "postgres" if "postgres" not in databases else "template1"
+        )
+        cmd = ["psql", "-U", self.user, "-d", maintenance]
+        cmd += ["-v", "ON_ERROR_STOP=1", "-c", sql]
+        return self._exec(container, cmd)
+
+    def clone_database(
+        self, container: "Container", template: str, name: str
+    ) -> None:
+        self.drop_database(container, name)
+        self._psql(
+            container,
+            f'CREATE DATABASE "{name}" TEMPLATE "{template}"',
+            template,
+            name,
+        )
+
+    def drop_database(self, container: "Container", name: str) -> None:
+        self._psql(container, f'DROP DATABASE IF EXISTS "{name}"', name)
+
+
+class MySQL(Engine):
+    name = "mysql"
+    scheme = "mysql"
+    image_hints = ("mysql", "mysql-server", "mariadb", "percona-server")
+    default_port = "3306"
+    no_durability_args = [
+        "--innodb-flush-log-at-trx-commit=0",
+        "--sync-binlog=0",
+        "--skip-innodb-doublewrite",
+    ]
+
+    _root_password_vars = (
+        "MYSQL_ROOT_PASSWORD",
+        "MYSQL_ALLOW_EMPTY_PASSWORD",
+        "MYSQL_RANDOM_ROOT_PASSWORD",
+        "MARIADB_ROOT_PASSWORD",
+        "MARIADB_ALLOW_EMPTY_ROOT_PASSWORD",
+        "MARIADB_RANDOM_ROOT_PASSWORD",
+    )
+
+    def default_env(self) -> Dict[str, str]:
+        if any(var in self.env for var in self._root_password_vars):
+            return {}
+        return {"MYSQL_ROOT_PASSWORD": "mysql"}
+
+    @property
+    def ready_cmd(self) -> Optional[str]:
+        # MariaDB 11 images no longer ship mysqladmin
+        return (
+            "sh -c 'mysqladmin ping -h 127.0.0.1 2>/dev/null "
+            "|| mariadb-admin ping -h 127.0.0.1'"
+        )
+
+    @property
+    def user(self) -> str:
+        return "root"
+
+    @property
+    def password(self) -> Optional[str]:
+        return self.env.get("MYSQL_ROOT_PASSWORD") or self.env.get(
+            "MARIADB_ROOT_PASSWORD"
+        )
+
+    @property
+    def database(self) -> Optional[str]:
+        return self.env.get("MYSQL_DATABASE") or self.env.get(
+            "MARIADB_DATABASE"
+        )
+
+    @property
+    def data_dir(self) -> Optional[str]:
+        return "/var/lib/mysql"
+
+    def _mysql_env(self) -> Dict[str, str]:
+        return {"MYSQL_PWD": self.password or ""}
+
+    def _mysql(self, container: "Container", sql: str) -> str:
+        cmd = ["mysql", "-u", self.user, "-e", sql]
+        return self._exec(container, cmd, self._mysql_env())
+
+    def clone_database(
+        self, container: "Container", template: str, name: str
+    ) -> None:
+        self.drop_database(container, name)
+        self._mysql(container, f"CREATE DATABASE `{name}`")
+        # MySQL has no template databases, copy the schema and data with a
+        # dump that is piped straight back into the server.
+        copy = (
+            f"mysqldump -u {self.user} --routines --triggers "
+            f"--single-transaction {template} | mysql -u {self.user} {name}"
+        )
+        self._exec(container, ["sh", "-c", copy], self._mysql_env())
+
+    def drop_database(self, container: "Container", name: str) -> None:
+        self._mysql(container, f"DROP DATABASE IF EXISTS `{name}`")
+
+
+class Mongo(Engine):
+    name = "mongo"
+    scheme = "mongodb"
+    image_hints = ("mongo", "mongodb", "mongodb-community-server")
+    default_port = "27017"
+    # the journal can't be turned off since MongoDB 6.1
+    no_durability_args = [
+        "--setParameter",
+        "diagnosticDataCollectionEnabled=false",
+    ]
+
+    @property
+    def ready_cmd(self) -> Optional[str]:
+        # images before MongoDB 6 only ship the legacy mongo shell
+        ping = "--quiet --eval 'db.runCommand({ping: 1})'"
+        return f'sh -c "mongosh {ping} || mongo {ping}"'
+
+    @property
+    def user(self) -> str:
+        return self.env.get("MONGO_INITDB_ROOT_USERNAME", "")
+
+    @property
+    def password(self) -> Optional[str]:
+        return self.env.get("MONGO_INITDB_ROOT_PASSWORD")
+
+    @property
+    def database(self) -> Optional[str]:
+        return self.env.get("MONGO_INITDB_DATABASE")
+
+    @property
+    def data_dir(self) -> Optional[str]:
+        return "/data/db"
+
+    def flush(self, container: "Container") -> None:
+        # the admin, config and local databases belong to the server
+        script = (
+            "db.getMongo().getDBNames()"
+            ".filter(n => !['admin', 'config', 'local'].includes(n))"
+            ".forEach(n => db.getSiblingDB(n).dropDatabase())"
+        )
+        args = ["--quiet", "--eval", script]
+        if self.user:
+            args += ["-u", self.user, "-p", self.password or ""]
+            args += ["--authenticationDatabase", "admin"]
+        # images before MongoDB 6 only ship the legacy mongo shell
+        quoted = " ".join(shlex.quote(arg) for arg in args)
+        cmd = f"mongosh {quoted} || mongo {quoted}"
+        self._exec(container, ["sh", "-c", cmd])
+
+    def dsn(self, host: str, port: str, database: Optional[str] = None) -> str:
+        dsn = super().dsn(host, port, database)
+        if self.user:
+            # the root user is created in the admin database
+            dsn = f"{dsn}?authSource=admin"
+        return dsn
+
+
+class Redis(Engine):
+    name = "redis"
+    scheme = "redis"
+    image_hints = ("redis", "redis-stack", "redis-stack-server", "valkey")
+    default_port = "6379"
+    no_durability_args = ["--save", "", "--appendonly", "no"]
+
+    @property
+    def ready_cmd(self) -> Optional[str]:
+        return "redis-cli ping"
+
+    @property
+    def user(self) -> str:
+        return ""
+
+    @property
+    def password(self) -> Optional[str]:
+        return None
+
+    @property
+    def database(self) -> Optional[str]:
+        return "0"
+
+    @property
+    def data_dir(self) -> Optional[str]:
+        return "/data"
+
+    def flush(self, container: "Container") -> None:
+        self._exec(container, ["redis-cli", "FLUSHALL"])
+
+
+#: the built in engines, see the ``pytest_docker_db_add_engines`` hook
+ENGINES: Dict[str, Type[Engine]] = {
+    "postgres": Postgres,
+    "mysql": MySQL,
+    "mongo": Mongo,
+    "redis": Redis,
+}
+
+
+def detect(
+    image: Optional[str], registry: Optional[Dict[str, Type[Engine]]] = None
+) -> Optional[str]:
+    """
+    Guesses the engine from an image name like ``postgres:15``.
+
+    The image's repository has to be one of the engine's ``image_hints``,
+    images whose name only contains one, e.g. ``postgres-exporter``, are
+    not detected. Their engine can be set with ``db-engine``.
+
+    :param registry: the engines to choose from, defaults to
+        :data:`ENGINES`.
+    :return: the name of the engine or `None` if it is unknown.
+    """
+    if not image:
+        return None
+    repository = image.rsplit("/", 1)[-1].split(":", 1)[0].lower()
+    for name, engine in (registry or ENGINES).items():
+        if repository in engine.image_hints:
+            return name
+    return None
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""
+Hooks that can be implemented in a ``conftest.py`` file to customize the
+plugin.
+"""
+
+
+def pytest_docker_db_prepare(container, config):
+    """
+    Called once a newly created database container is ready, e.g. to run
+    migrations.
+
+    When ``db-snapshot-files`` is set the prepared database is saved as an
+    image and later sessions start from that image, so this hook is only
+    called again when one of the snapshot files changes.
+
+    :param container: the docker-py ``Container`` running the database.
+    :param config: the pytest ``Config`` object.
+    """
+
+
+def pytest_docker_db_add_engines(engines):
+    """
+    Called once at the start of the session to register more database
+    engines, e.g.::
+
+        def pytest_docker_db_add_engines(engines):
+            engines["cockroach"] = CockroachDB
+
+    :param engines: a ``dict`` of engine name to a subclass of
+        ``pytest_docker_db.engines.Engine``, add your engines to it. The
+        name can be used with ``db-engine`` and the engine's
+        ``image_hints``, the repositories of its images, are used to detect
+        it from ``db-image``.
+    """
+
+
+def pytest_docker_db_timings(timings, config):
+    """
+    Called at the end of the session with the time every phase of the
+    containers' life cycle took, e.g. to export them to a metrics system.
+
+    With pytest-xdist it is only called in the controller, with the
+    timings of all workers.
+
+    :param timings: the ``pytest_docker_db.timing.Timings``, see its
+        ``records`` and ``summary()``.
+    :param config: the pytest ``Config`` object.
+    """
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+"""
+Labels the plugin puts on the containers it creates.
+"""
+
+#: set on every container created by the plugin
+MANAGED = "pytest-docker-db"
+
+#: a hash of the options the container was created with
+FINGERPRINT = "pytest-docker-db.fingerprint"
+
+#: the id of the pool a container belongs to, see :mod:`pytest_docker_db.pool`
+POOL = "pytest-docker-db.pool"
+
+#: the process that owns the container, the pytest session or the pool
+OWNER_PID = "pytest-docker-db.owner-pid"
+
+#: the host the owner runs on
+OWNER_HOST = "pytest-docker-db.owner-host"
+
+#: when the container was created, in seconds since the epoch
+CREATED = "pytest-docker-db.created"
+
+#: set on containers that are meant to outlive their owner
+PERSIST = "pytest-docker-db.persist"
+
+#: the project and service a ``db-reuse`` container is reused for, see
+#: :func:`pytest_docker_db.reaper.collect_outdated`
+REUSE = "pytest-docker-db.reuse"
@@ -0,0 +1,315 @@
+# -*- coding: utf-8 -*-
+"""
+A pool of ready database containers that is shared by pytest sessions.
+
+The pool is a small daemon, started with ``pytest-docker-db pool``, that
+keeps ``size`` containers created, started and ready. Sessions lease a
+container over a Unix socket with ``--db-pool``. A lease lasts as long as
+the session keeps its connection to the daemon open, so a crashed session
+can't leak a container. Returned containers are removed and replaced in the
+background, every session gets a pristine database.
+
+The protocol is one JSON object per line::
+
+    -> {"op": "lease"}
+    <- {"id": "...", "name": "..."}
+    -> {"op": "release"}
+
+    -> {"op": "status"}
+    <- {"ready": 3, "leased": 1, "starting": 0}
+"""
+
+import json
+import logging
+import os
+import queue
+import socket
+import socketserver
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, TYPE_CHECKING
+
+import pytest_docker_db.labels as labels
+import pytest_docker_db.readiness as readiness
+import pytest_docker_db.reaper as reaper
+import pytest_docker_db.util as utils
+
+if TYPE_CHECKING:
+    from docker import DockerClient
+    from docker.models.containers import Container
+
+log = logging.getLogger(__name__)
+
+
+class PoolError(Exception):
+    """Raised when a container can't be leased from the pool."""
+
+
+class ContainerPool:
+    """
+    Keeps ``size`` ready containers of ``image``.
+
+    :param client: the docker client.
+    :param image: the image to start, e.g. a snapshot created by
+        ``db-snapshot-files`` so that the databases are already migrated.
+    :param port: the port of the database in the container.
+    :param env_vars: ``KEY=VALUE`` environment variables.
+    :param size: how many ready containers to keep.
+    :param ready_timeout: how long to wait for a container to be ready.
+    :param ready_log: see ``db-ready-log``.
+    :param ready_cmd: see ``db-ready-cmd``.
+    """
+
+    def __init__(
+        self,
+        client: "DockerClient",
+        image: str,
+        port: Optional[str] = None,
+        env_vars: Optional[List[str]] = None,
+        size: int = 2,
+        ready_timeout: float = 60.0,
+        ready_log: Optional[str] = None,
+        ready_cmd: Optional[str] = None,
+    ):
+        self.client = client
+        self.image = image
+        self.port = port
+        self.env_vars = env_vars
+        self.size = size
+        self.ready_timeout = ready_timeout
+        self.ready_log = ready_log
+        self.ready_cmd = ready_cmd
+        self.pool_id = str(uuid.uuid4())
+
+        self._ready: "queue.Queue[Container]" = queue.Queue()
+        self._leased: Dict[str, "Container"] = {}
+        self._starting = 0
+        self._lock = threading.Lock()
+        self._workers = ThreadPoolExecutor(
+            max_workers=max(size, 1), thread_name_prefix="docker-db-pool"
+        )
+        self._closed = False
+
+    def fill(self) -> None:
+        """Starts containers until there are ``size`` ready or starting."""
+        with self._lock:
+            missing = self.size - self._ready.qsize() - self._starting
+            self._starting += max(missing, 0)
+        for _ in range(missing):
+            self._workers.submit(self._add_container)
+
+    def lease(self, timeout: Optional[float] = None) -> "Container":
+        """
+        Takes a ready container out of the pool and starts a replacement.
+
+        :raises PoolError: if no container is ready within ``timeout``.
+        """
+        try:
+            container = self._ready.get(timeout=timeout)
+        except queue.Empty:
+            raise PoolError(f"No container was ready after {timeout}s.")
+        with self._lock:
+            self._leased[container.id] = container
+        self.fill()
+        return container
+
+    def release(self, container_id: str) -> None:
+        """Removes a leased container in the background."""
+        with self._lock:
+            self._leased.pop(container_id, None)
+        if self._closed:
+            self._remove(container_id)
+        else:
+            self._workers.submit(self._remove, container_id)
+
+    def status(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "ready": self._ready.qsize(),
+                "leased": len(self._leased),
+                "starting": self._starting,
+            }
+
+    def close(self) -> None:
+        """Removes every container of the pool, leased or not."""
+        self._closed = True
+        self._workers.shutdown(wait=True)
+        ids = list(self._leased)
+        while not self._ready.empty():
+            ids.append(self._ready.get_nowait().id)
+        for container_id in ids:
+            self._remove(container_id)
+
+    def _add_container(self) -> None:
+        # any error, e.g. of a restarting daemon, must give the slot back or
+        # fill() would count it as starting forever
+        try:
+            container = self._start()
+        except Exception:
+            log.exception("Unable to start a container for the pool.")
+            container = None
+        finally:
+            with self._lock:
+                self._starting -= 1
+        if container is None:
+            return
+        if self._closed:
+            self._remove(container.id)
+        else:
+            self._ready.put(container)
+
+    def _start(self) -> "Container":
+        container = self.client.containers.create(
+            image=self.image,
+            name=f"docker-db-pool-{uuid.uuid4()}",
+            ports={self.port: None} if self.port else None,
+            detach=True,
+            environment=self.env_vars,
+            labels={
+                labels.MANAGED: "true",
+                labels.POOL: self.pool_id,
+                **reaper.owner_labels(),
+            },
+        )
+        try:
+            container.start()
+            readiness.wait_until_ready(
+                container, self._probes(container), self.ready_timeout
+            )
+        except Exception:
+            self._remove(container.id)
+            raise
+        return container
+
+    def _probes(self, container: "Container") -> List[readiness.Probe]:
+        container.reload()
+        return readiness.default_probes(
+            container,
+            utils.docker_host(self.client.api.base_url),
+            self.port,
+            self.ready_log,
+            self.ready_cmd,
+        )
+
+    def _remove(self, container_id: str) -> None:
+        try:
+            self.client.api.remove_container(container_id, v=True, force=True)
+        except Exception:
+            log.warning("Unable to remove container with ID: %s", container_id)
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    server: "PoolServer"
+
+    def handle(self):
+        leased: List[str] = []
+        try:
+            for line in self.rfile:
+                request = json.loads(line)
+                response = self._dispatch(request, leased)
+                self.wfile.write(json.dumps(response).encode() + b"\n")
+                self.wfile.flush()
+        except (OSError, ValueError):
+            pass
+        finally:
+            # the session is gone, whether it released its lease or not
+            for container_id in leased:
+                self.server.pool.release(container_id)
+
+    def _dispatch(self, request: Dict[str, Any], leased: List[str]):
+        pool = self.server.pool
+        op = request.get("op")
+        if op == "lease":
+            try:
+                container = pool.lease(timeout=request.get("timeout"))
+            except PoolError as e:
+                return {"error": str(e)}
+            leased.append(container.id)
+            return {"id": container.id, "name": container.name}
+        if op == "release":
+            for container_id in leased:
+                pool.release(container_id)
+            leased.clear()
+            return {"released": True}
+        if op == "status":
+            return pool.status()
+        return {"error": f"Unknown op {op!r}"}
+
+
+class PoolServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Serves a :class:`ContainerPool` on the Unix socket at ``path``."""
+
+    daemon_threads = True
+
+    def __init__(self, path: str, pool: ContainerPool):
+        self.pool = pool
+        super().__init__(path, _Handler)
+
+
+class PoolClient:
+    """
+    Leases a container from the pool daemon listening on ``path``.
+
+    The connection is kept open for as long as the lease is held.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._sock: Optional[socket.socket] = None
+        self._file = None
+
+    def lease(self, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        :return: the ``id`` and ``name`` of the leased container.
+        :raises PoolError: if the pool can't hand out a container.
+        """
+        try:
+            self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._sock.connect(self.path)
+        except OSError as e:
+            raise PoolError(
+                f"Unable to connect to the pool at {self.path}: {e}"
+            )
+        self._file = self._sock.makefile("rwb")
+        response = self._request({"op": "lease", "timeout": timeout})
+        if "error" in response:
+            raise PoolError(response["error"])
+        return response
+
+    def release(self) -> None:
+        if self._sock is None:
+            return
+        try:
+            self._request({"op": "release"})
+        except (OSError, ValueError, PoolError):
+            pass
+        finally:
+            self._file.close()
+            self._sock.close()
+            self._sock = None
+
+    def _request(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        self._file.write(json.dumps(request).encode() + b"\n")
+        self._file.flush()
+        line = self._file.readline()
+        if not line:
+            raise PoolError("The pool closed the connection.")
+        return json.loads(line)
+
+
+def serve(path: str, pool: ContainerPool) -> None:
+    """
+    Fills ``pool`` and serves it on ``path`` until interrupted.
+
+    The containers of the pool and the socket are removed when the server
+    stops.
+    """
+    server = PoolServer(path, pool)
+    pool.fill()
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        os.unlink(path)
+        pool.close()
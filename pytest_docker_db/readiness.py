@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+"""
+Readiness probes used to decide when a database container is actually able
+to accept connections.
+
+A container being in the ``running`` state only means that its entrypoint
+has been started, most databases still need a few seconds (or longer, e.g.
+when running ``initdb``) before they will accept a connection.
+"""
+
+import re
+import socket
+import time
+from typing import Callable, List, Optional, Sequence, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from docker.models.containers import Container
+
+
+class ReadinessError(Exception):
+    """Raised when a container does not become ready."""
+
+
+class Probe:
+    """
+    Base class for all readiness probes.
+
+    Subclasses must implement :meth:`check` which should return ``True``
+    once the container is ready and ``False`` otherwise. It must not raise
+    because the container is not ready yet.
+    """
+
+    def check(self, container: "Container") -> bool:
+        raise NotImplementedError
+
+    def describe(self) -> str:
+        return self.__class__.__name__
+
+    def __repr__(self):
+        return f"<{self.describe()}>"
+
+
+class TcpProbe(Probe):
+    """
+    Connects to the port published on the host for ``container_port``.
+
+    Docker's userland proxy accepts connections on the host port even when
+    nothing is listening inside of the container yet, it simply closes the
+    connection right away. Because of that, a connection is only considered
+    successful if the server either sends data or keeps the connection open
+    for ``read_timeout`` seconds.
+    """
+
+    def __init__(
+        self, host: str, container_port: str, read_timeout: float = 0.2
+    ):
+        self.host = host
+        self.container_port = container_port
+        self.read_timeout = read_timeout
+
+    def describe(self) -> str:
+        return f"TcpProbe({self.host}, {self.container_port})"
+
+    def check(self, container: "Container") -> bool:
+        port = published_port(container, self.container_port)
+        if port is None:
+            return False
+
+        try:
+            with socket.create_connection((self.host, port), timeout=1) as s:
+                s.settimeout(self.read_timeout)
+                try:
+                    return s.recv(1) != b""
+                except socket.timeout:
+                    return True
+        except OSError:
+            return False
+
+
+class LogProbe(Probe):
+    """
+    Matches a regular expression against the container's log output.
+
+    :param pattern: the regex to search for.
+    :param occurrences: how many times the pattern has to appear. This is
+        useful for images like postgres that start a temporary server while
+        initializing the database.
+    """
+
+    def __init__(self, pattern: str, occurrences: int = 1):
+        self.pattern = re.compile(pattern, re.MULTILINE)
+        self.occurrences = occurrences
+
+    def describe(self) -> str:
+        return f"LogProbe({self.pattern.pattern!r})"
+
+    def check(self, container: "Container") -> bool:
+        from docker.errors import APIError
+
+        try:
+            logs = container.logs(stdout=True, stderr=True)
+        except APIError:
+            return False
+        logs = logs.decode("utf-8", errors="replace")
+        return len(self.pattern.findall(logs)) >= self.occurrences
+
+
+class ExecProbe(Probe):
+    """Runs a command in the container and checks that it exits with 0."""
+
+    def __init__(self, cmd: str):
+        self.cmd = cmd
+
+    def describe(self) -> str:
+        return f"ExecProbe({self.cmd!r})"
+
+    def check(self, container: "Container") -> bool:
+        from docker.errors import APIError
+
+        try:
+            result = container.exec_run(self.cmd)
+        except APIError:
+            return False
+        return result.exit_code == 0
+
+
+class HealthcheckProbe(Probe):
+    """Waits for the image's ``HEALTHCHECK`` to report ``healthy``."""
+
+    def check(self, container: "Container") -> bool:
+        health = container.attrs.get("State", {}).get("Health") or {}
+        return health.get("Status") == "healthy"
+
+
+def has_healthcheck(container: "Container") -> bool:
+    """`True` if the container's image defines a ``HEALTHCHECK``."""
+    healthcheck = container.attrs.get("Config", {}).get("Healthcheck") or {}
+    test = healthcheck.get("Test") or []
+    return bool(test) and test[0] != "NONE"
+
+
+def default_probes(
+    container: "Container",
+    host: str,
+    container_port: Optional[str] = None,
+    log_pattern: Optional[str] = None,
+    cmd: Optional[str] = None,
+) -> List[Probe]:
+    """
+    Returns the probes for a container.
+
+    A TCP probe is used whenever a container port is known, the log and
+    command probes are used if they are given and the image's
+    ``HEALTHCHECK`` is used if it has one.
+
+    :param container: the container, its attrs should be up to date.
+    :param host: the host the container's ports are published on.
+    """
+    probes: List[Probe] = []
+    if container_port is not None:
+        probes.append(TcpProbe(host, container_port))
+    if log_pattern is not None:
+        probes.append(LogProbe(log_pattern))
+    if cmd is not None:
+        probes.append(ExecProbe(cmd))
+    if has_healthcheck(container):
+        probes.append(HealthcheckProbe())
+    return probes
+
+
+def published_port(
+    container: "Container", container_port: str
+) -> Optional[str]:
+    """
+    Returns the host port that ``container_port`` is published on.
+
+    :param container: the container, its attrs should be up to date.
+    :param container_port: the port in the container, e.g. ``5432`` or
+        ``5432/tcp``.
+    """
+    key = str(container_port)
+    if "/" not in key:
+        key = f"{key}/tcp"
+    ports = container.attrs.get("NetworkSettings", {}).get("Ports") or {}
+    bindings = ports.get(key)
+    if not bindings:
+        return None
+    return bindings[0].get("HostPort")
+
+
+def wait_until_ready(
+    container: "Container",
+    probes: Sequence[Probe],
+    timeout: float,
+    initial_delay: float = 0.05,
+    max_delay: float = 1.0,
+    clock: Callable[[], float] = time.monotonic,
+    sleep: Callable[[float], None] = time.sleep,
+) -> None:
+    """
+    Polls all ``probes`` until each of them has passed once.
+
+    The delay between polls starts at ``initial_delay`` and doubles after
+    every poll up to ``max_delay``, so a fast database is picked up quickly
+    without hammering the docker daemon while a slow one is starting.
+
+    :raises ReadinessError: if the deadline passes or the container stops.
+    """
+    deadline = clock() + timeout
+    pending: List[Probe] = list(probes)
+    delay = initial_delay
+
+    while True:
+        container.reload()
+        status = container.status
+        if status in ("exited", "dead"):
+            raise ReadinessError(
+                f"Container {container.name} stopped with status {status!r} "
+                f"before it was ready.\n{_tail_logs(container)}"
+            )
+
+        pending = [p for p in pending if not p.check(container)]
+        if not pending:
+            return
+
+        remaining = deadline - clock()
+        if remaining <= 0:
+            raise ReadinessError(
+                f"Container {container.name} was not ready after {timeout}s. "
+                f"Waiting on: {', '.join(p.describe() for p in pending)}"
+                f"\n{_tail_logs(container)}"
+            )
+        sleep(min(delay, remaining))
+        delay = min(delay * 2, max_delay)
+
+
+def _tail_logs(container: "Container", lines: int = 20) -> str:
+    from docker.errors import APIError
+
+    try:
+        logs = container.logs(tail=lines)
+    except APIError:
+        return ""
+    return logs.decode("utf-8", errors="replace")
@@ -0,0 +1,291 @@
+# -*- coding: utf-8 -*-
+"""
+Removes containers outside of the pytest session.
+
+Stopping a database and removing its container and volumes can take
+seconds. With ``--db-teardown=background`` the containers are only told to
+stop when the session tears them down, the rest is left to a detached
+``pytest-docker-db reap`` process so that pytest can exit right away.
+
+Sessions that are killed never tear their containers down. Every container
+is labelled with its owner and creation time, :func:`collect` removes the
+ones whose owner is gone or that are older than a TTL.
+"""
+
+import logging
+import os
+import socket
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, TYPE_CHECKING
+
+import pytest_docker_db.labels as labels
+import pytest_docker_db.util as utils
+
+if TYPE_CHECKING:
+    from docker import DockerClient
+
+log = logging.getLogger(__name__)
+
+
+class Reaper:
+    """
+    Collects the containers of a session and hands them to a background
+    process once the session is over.
+
+    :param stop_timeout: how many seconds the containers get to stop before
+        they are killed.
+    """
+
+    def __init__(self, stop_timeout: float):
+        self.stop_timeout = stop_timeout
+        self.container_ids: List[str] = []
+
+    def add(self, _docker: "DockerClient", container_id: str) -> None:
+        """
+        Tells the container to stop and renames it, so that its name can be
+        used again right away.
+        """
+        from docker.errors import APIError
+
+        try:
+            _docker.api.kill(container_id, signal="SIGTERM")
+            _docker.api.rename(
+                container_id, f"docker-db-reaped-{container_id[:12]}"
+            )
+        except APIError:
+            # it is stopped and removed by the reaper all the same
+            pass
+        self.container_ids.append(container_id)
+
+    def spawn(self) -> None:
+        """Starts the detached reaper process, if there is anything to do."""
+        if not self.container_ids:
+            return
+        cmd = [sys.executable, "-m", "pytest_docker_db.cli", "reap"]
+        cmd += ["--timeout", str(self.stop_timeout), *self.container_ids]
+        kwargs: Dict = {}
+        if os.name == "nt":
+            flags = subprocess.DETACHED_PROCESS
+            flags |= subprocess.CREATE_NEW_PROCESS_GROUP
+            kwargs["creationflags"] = flags
+        else:
+            kwargs["start_new_session"] = True
+        subprocess.Popen(
+            cmd,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            close_fds=True,
+            **kwargs,
+        )
+        self.container_ids = []
+
+
+def reap(
+    _docker: "DockerClient", container_ids: List[str], timeout: float
+) -> None:
+    """
+    Stops the containers, giving them ``timeout`` seconds, and removes them
+    with their anonymous volumes. All containers are handled concurrently.
+    """
+    from docker.errors import APIError, NotFound
+
+    if not container_ids:
+        return
+
+    def remove(container_id: str) -> None:
+        try:
+            _docker.api.stop(container_id, timeout=int(timeout))
+        except NotFound:
+            return
+        except APIError:
+            pass
+        try:
+            _docker.api.remove_container(container_id, v=True, force=True)
+        except NotFound:
+            pass
+        except APIError as e:
+            log.warning("Unable to remove container %s: %s", container_id, e)
+
+    with ThreadPoolExecutor(max_workers=min(len(container_ids), 16)) as pool:
+        list(pool.map(remove, container_ids))
+
+
+def owner_labels(persist: bool = False) -> Dict[str, str]:
+    """
+    The labels that tell who created a container and when.
+
+    The owner of a pytest-xdist worker's containers is the controller, the
+    containers of a shared session outlive the single workers.
+
+    :param persist: the container is meant to outlive its owner, e.g. with
+        ``db-persist-container``. It is only removed by :func:`cleanup`.
+    """
+    owner = os.getppid() if utils.xdist_worker_id() else os.getpid()
+    owner_labels = {
+        labels.OWNER_PID: str(owner),
+        labels.OWNER_HOST: socket.gethostname(),
+        labels.CREATED: str(int(time.time())),
+    }
+    if persist:
+        owner_labels[labels.PERSIST] = "true"
+    return owner_labels
+
+
+def is_leaked(
+    container_labels: Dict[str, str],
+    ttl: Optional[float] = None,
+    now: Optional[float] = None,
+) -> bool:
+    """
+    `True` if the container's owner is gone or the container is older than
+    ``ttl`` seconds.
+
+    Whether the owner is gone can only be told on the owner's host, the
+    containers of other hosts sharing the daemon only expire. The
+    containers of an owner that is alive never expire, e.g. a long running
+    ``pytest-docker-db pool`` still hands them out, and neither do the
+    pools' containers of other hosts. Persisted containers are never
+    leaked, outdated ``db-reuse`` containers are removed by
+    :func:`collect_outdated`.
+    """
+    if container_labels.get(labels.PERSIST) == "true":
+        return False
+
+    pid = container_labels.get(labels.OWNER_PID)
+    host = container_labels.get(labels.OWNER_HOST)
+    if pid is not None and host == socket.gethostname():
+        return not _pid_alive(int(pid))
+    if labels.POOL in container_labels:
+        return False
+
+    return _expired(container_labels, ttl, now)
+
+
+def _expired(
+    container_labels: Dict[str, str],
+    ttl: Optional[float],
+    now: Optional[float],
+) -> bool:
+    created = container_labels.get(labels.CREATED)
+    if ttl and created is not None:
+        age = (now if now is not None else time.time()) - float(created)
+        return age > ttl
+    return False
+
+
+def collect(
+    _docker: "DockerClient",
+    ttl: Optional[float] = None,
+    dry_run: bool = False,
+) -> List[str]:
+    """
+    Removes the containers that leaked, see :func:`is_leaked`. Named volumes
+    are left alone, they may hold data that is meant to be kept.
+
+    :return: the IDs of the leaked containers.
+    """
+    containers = _docker.containers.list(
+        all=True, sparse=True, filters={"label": labels.MANAGED}
+    )
+    leaked = [
+        c.id for c in containers if is_leaked(c.attrs.get("Labels") or {}, ttl)
+    ]
+    if not dry_run:
+        _remove_containers(_docker, leaked)
+    return leaked
+
+
+def collect_outdated(
+    _docker: "DockerClient",
+    reuse_key: str,
+    fingerprint: str,
+    ttl: Optional[float] = None,
+    now: Optional[float] = None,
+) -> List[str]:
+    """
+    Removes the ``db-reuse`` containers of ``reuse_key`` that were created
+    with another ``fingerprint`` more than ``ttl`` seconds ago. They are
+    persisted, so :func:`collect` never removes them, but they are only
+    reused again if the options are changed back.
+
+    :return: the IDs of the outdated containers.
+    """
+    if not ttl:
+        return []
+    containers = _docker.containers.list(
+        all=True,
+        sparse=True,
+        filters={"label": f"{labels.REUSE}={reuse_key}"},
+    )
+    outdated = []
+    for c in containers:
+        container_labels = c.attrs.get("Labels") or {}
+        if container_labels.get(labels.FINGERPRINT) == fingerprint:
+            continue
+        if _expired(container_labels, ttl, now):
+            outdated.append(c.id)
+    _remove_containers(_docker, outdated)
+    return outdated
+
+
+def _pid_alive(pid: int) -> bool:
+    if os.name == "nt":
+        # os.kill terminates the process on windows, rely on the TTL
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # it exists but belongs to someone else
+        return True
+    return True
+
+
+def _remove_containers(_docker: "DockerClient", container_ids: List[str]):
+    from docker.errors import NotFound
+
+    def remove(container_id: str) -> None:
+        try:
+            _docker.api.remove_container(container_id, v=True, force=True)
+        except NotFound:
+            pass
+
+    if container_ids:
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            list(pool.map(remove, container_ids))
+
+
+def cleanup(_docker: "DockerClient", dry_run: bool = False) -> Dict[str, list]:
+    """
+    Removes every container and volume created by the plugin, e.g. the ones
+    left behind by sessions that crashed, in one pass.
+
+    :return: the ``containers`` and ``volumes`` that were removed.
+    """
+    from docker.errors import NotFound
+
+    managed = {"label": labels.MANAGED}
+    containers = _docker.containers.list(
+        all=True, sparse=True, filters=managed
+    )
+    container_ids = [c.id for c in containers]
+    volumes = [v.name for v in _docker.volumes.list(filters=managed)]
+    if dry_run:
+        return {"containers": container_ids, "volumes": volumes}
+
+    def remove_volume(name: str) -> None:
+        try:
+            _docker.api.remove_volume(name, force=True)
+        except NotFound:
+            pass
+
+    # the containers have to be gone before their volumes can be removed
+    _remove_containers(_docker, container_ids)
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        list(pool.map(remove_volume, volumes))
+    return {"containers": container_ids, "volumes": volumes}
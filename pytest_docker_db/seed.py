@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""
+Bulk loads seed data into the database, see ``db-seed``.
+
+Seed files are loaded with the database's bulk loader, ``COPY FROM STDIN``
+for postgres and ``LOAD DATA LOCAL INFILE`` for MySQL, which is orders of
+magnitude faster than inserting the rows one by one:
+
+- ``*.sql`` scripts are run first, one after the other, e.g. to create the
+  tables.
+- ``<table>.csv`` files are loaded into the table named like the file,
+  ``public.users.csv`` is loaded into ``public.users``. The first line is
+  the header with the names of the columns.
+- ``<table>.parquet`` files are converted to CSV with ``pyarrow`` first.
+
+The files are streamed from memory maps in chunks and the tables are loaded
+in parallel, each on its own connection.
+
+A checksum of the files is saved in the database. When the seed data did
+not change, e.g. in a reused container, loading it is skipped. When it did,
+the tables are truncated and loaded again and the scripts are run again, so
+they must be idempotent. With ``db-reuse`` the checksum is part of the
+container's fingerprint, a container with outdated seed data is recreated
+instead.
+"""
+
+import csv
+import hashlib
+import io
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, List, Optional, Sequence, TYPE_CHECKING
+
+import pytest_docker_db.util as utils
+
+if TYPE_CHECKING:
+    from pytest_docker_db.adapters import Adapter
+
+#: the file extensions that can be loaded
+FORMATS = (".sql", ".csv", ".parquet")
+
+
+class SeedError(Exception):
+    """Raised when seed data can't be loaded."""
+
+
+def table_name(path: str) -> str:
+    """The table a data file is loaded into, the file name without suffix."""
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def checksum(root: str, files: Iterable[str]) -> str:
+    """
+    A sha256 hex digest of the names and the content of ``files``.
+
+    :param root: the directory ``files`` are relative to.
+    """
+    digest = hashlib.sha256()
+    for rel in files:
+        digest.update(f"{rel.replace(os.sep, '/')}\0".encode("utf-8"))
+        for chunk in utils.read_chunks(os.path.join(root, rel)):
+            digest.update(chunk)
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def load(
+    adapter: "Adapter",
+    root: str,
+    files: Sequence[str],
+    workers: int = 4,
+    digest: Optional[str] = None,
+) -> bool:
+    """
+    Loads the seed ``files`` unless the same files were loaded before.
+
+    :param root: the directory ``files`` are relative to.
+    :param workers: how many tables are loaded at the same time. Tables
+        that reference each other with foreign keys may have to be loaded
+        one after the other, with ``1``, in the order of ``files``.
+    :param digest: the :func:`checksum` of ``files``, if it is known.
+    :return: `False` if loading was skipped.
+    """
+    for rel in files:
+        if os.path.splitext(rel)[1].lower() not in FORMATS:
+            raise SeedError(
+                f"Unable to load {rel}, seed files must be one of "
+                f"{', '.join(FORMATS)}."
+            )
+    scripts = [f for f in files if f.lower().endswith(".sql")]
+    data = [f for f in files if f not in scripts]
+    if digest is None:
+        digest = checksum(root, files)
+
+    conn = adapter.seed_connect()
+    try:
+        loaded = adapter.seed_checksum(conn)
+        conn.commit()
+        if loaded == digest:
+            return False
+        if loaded is not None and data:
+            # the previous seed data is replaced, not added to
+            adapter.truncate(
+                conn, [adapter.quote(table_name(f)) for f in data]
+            )
+            conn.commit()
+        for rel in scripts:
+            with open(os.path.join(root, rel), encoding="utf-8") as f:
+                adapter.execute_script(conn, f.read())
+            conn.commit()
+    finally:
+        conn.close()
+
+    if data:
+
+        def load_one(rel: str) -> None:
+            _load_file(adapter, os.path.join(root, rel))
+
+        with ThreadPoolExecutor(max_workers=min(workers, len(data))) as pool:
+            list(pool.map(load_one, data))
+
+    conn = adapter.seed_connect()
+    try:
+        adapter.set_seed_checksum(conn, digest)
+        conn.commit()
+    finally:
+        conn.close()
+    return True
+
+
+def _load_file(adapter: "Adapter", path: str) -> None:
+    table = adapter.quote(table_name(path))
+    conn = adapter.seed_connect()
+    try:
+        if path.lower().endswith(".parquet"):
+            with tempfile.TemporaryDirectory() as tmp:
+                csv_path = os.path.join(tmp, "data.csv")
+                columns = _parquet_to_csv(path, csv_path)
+                quoted = [adapter.quote(c) for c in columns]
+                adapter.load_csv(conn, table, quoted, csv_path)
+        else:
+            quoted = [adapter.quote(c) for c in _csv_header(path)]
+            adapter.load_csv(conn, table, quoted, path)
+        conn.commit()
+    except Exception as e:
+        raise SeedError(f"Unable to load {path} into {table}.\n{e}") from e
+    finally:
+        conn.close()
+
+
+def _csv_header(path: str) -> List[str]:
+    with io.open(path, encoding="utf-8-sig", newline="") as f:
+        header = next(csv.reader(f), None)
+    if not header:
+        raise SeedError(f"{path} has no header with the column names.")
+    return header
+
+
+def _parquet_to_csv(path: str, csv_path: str) -> List[str]:
+    """
+    Converts the Parquet file to CSV one row group batch at a time.
+
+    :return: the names of the columns.
+    """
+    try:
+        import pyarrow.csv as pa_csv
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise SeedError(
+            "pyarrow must be installed to load Parquet files."
+        ) from None
+
+    parquet = pq.ParquetFile(path)
+    schema = parquet.schema_arrow
+    with pa_csv.CSVWriter(csv_path, schema) as writer:
+        for batch in parquet.iter_batches(batch_size=64 * 1024):
+            writer.write_batch(batch)
+    return list(schema.names)
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""
+State shared between pytest-xdist workers.
+
+Workers are separate processes, the only thing they have in common is the
+base temp directory that xdist creates for the session. Coordination is
+done through a JSON file in that directory which is only ever read or
+written while holding a lock on a sibling lock file.
+"""
+
+import json
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator
+
+import pytest_docker_db.util as utils
+
+
+class SharedState:
+    """
+    A JSON document that is shared between processes.
+
+    :param root: the directory to keep the state and lock files in.
+    :param key: the name of the state, used for the file names.
+    """
+
+    def __init__(self, root: Path, key: str):
+        self.path = Path(root) / f"{key}.json"
+        self.lock_path = Path(root) / f"{key}.lock"
+
+    @contextmanager
+    def locked(self) -> Iterator[Dict[str, Any]]:
+        """
+        Locks the state and yields its content as a ``dict``.
+
+        Changes made to the ``dict`` are written back when the block exits
+        without an exception. If an exception is raised the state is left
+        untouched.
+        """
+        with utils.file_lock(self.lock_path):
+            data = self.read()
+            yield data
+            self.path.write_text(json.dumps(data))
+
+    def read(self) -> Dict[str, Any]:
+        if not self.path.exists():
+            return {}
+        return json.loads(self.path.read_text() or "{}")
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+Snapshots of a prepared database.
+
+After the ``pytest_docker_db_prepare`` hook ran (e.g. to run migrations) the
+state of the database is saved as a local image. The image is tagged with a
+hash of everything that went into preparing it, so a later session with the
+same inputs can start from the image and skip the preparation entirely.
+"""
+
+import glob
+import hashlib
+import io
+import os
+import posixpath
+import tarfile
+import tempfile
+from typing import IO, Iterable, List, Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from docker import DockerClient
+    from docker.models.containers import Container
+
+SNAPSHOT_REPOSITORY = "pytest-docker-db-snapshot"
+
+
+def snapshot_files(root: str, patterns: Iterable[str]) -> List[str]:
+    """
+    Expands the glob ``patterns`` relative to ``root``.
+
+    :return: the sorted, de-duplicated list of matching file paths.
+    """
+    paths = set()
+    for pattern in patterns:
+        for path in glob.glob(os.path.join(root, pattern), recursive=True):
+            if os.path.isfile(path):
+                paths.add(os.path.relpath(path, root))
+    return sorted(paths)
+
+
+def snapshot_key(
+    root: str,
+    files: Iterable[str],
+    image: str,
+    env_vars: Optional[List[str]],
+    data_dir: Optional[str],
+) -> str:
+    """
+    Hashes the inputs of a snapshot.
+
+    :param root: the directory ``files`` are relative to.
+    :param files: the files whose content affects the prepared database,
+        e.g. migrations.
+    :param image: the image the database is started from.
+    :param env_vars: the environment of the container.
+    :param data_dir: the data directory that is archived, if any.
+    """
+    digest = hashlib.sha256()
+    for part in (image, data_dir or "", *sorted(env_vars or [])):
+        digest.update(part.encode("utf-8") + b"\0")
+    for path in files:
+        digest.update(path.replace(os.sep, "/").encode("utf-8") + b"\0")
+        with open(os.path.join(root, path), "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 16), b""):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def snapshot_tag(key: str) -> str:
+    return f"{SNAPSHOT_REPOSITORY}:{key[:16]}"
+
+
+def create_snapshot(
+    _docker: "DockerClient",
+    container: "Container",
+    base_image: str,
+    tag: str,
+    data_dir: Optional[str] = None,
+) -> None:
+    """
+    Saves the state of ``container`` as the image ``tag``.
+
+    Most database images declare their data directory as a ``VOLUME`` which
+    ``docker commit`` does not include. If ``data_dir`` is given it is
+    archived instead and added on top of ``base_image``, ``ADD`` keeps the
+    ownership of the files in the archive so the database can use them.
+
+    The container is stopped while the snapshot is taken so that the data
+    on disk is consistent, it is *not* restarted.
+    """
+    container.stop()
+
+    if data_dir is None:
+        repository, _, tag_name = tag.partition(":")
+        container.commit(repository=repository, tag=tag_name)
+        return
+
+    data_dir = data_dir.rstrip("/")
+    parent = posixpath.dirname(data_dir) or "/"
+    stream, _ = container.get_archive(data_dir)
+    dockerfile = f"FROM {base_image}\nADD data.tar {parent}/\n".encode()
+
+    with tempfile.TemporaryFile() as data, tempfile.TemporaryFile() as ctx:
+        for chunk in stream:
+            data.write(chunk)
+        size = data.tell()
+        data.seek(0)
+
+        with tarfile.open(fileobj=ctx, mode="w") as tar:
+            _add_file(
+                tar, "Dockerfile", io.BytesIO(dockerfile), len(dockerfile)
+            )
+            _add_file(tar, "data.tar", data, size)
+        ctx.seek(0)
+
+        _docker.images.build(
+            fileobj=ctx, custom_context=True, tag=tag, rm=True, pull=False
+        )
+
+
+def _add_file(tar: tarfile.TarFile, name: str, f: IO[bytes], size: int):
+    info = tarfile.TarInfo(name)
+    info.size = size
+    tar.addfile(info, f)
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+Timings of the phases of a container's life cycle.
+
+Every phase, e.g. pulling the image or waiting for the database to be
+ready, is timed with a monotonic clock. The timings are shown at the end of
+the session, can be written to a JSON file with ``db-timings-json`` and are
+passed to the ``pytest_docker_db_timings`` hook.
+"""
+
+import json
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+#: the phases in the order they happen in
+PHASES = (
+    "lease",
+    "lookup",
+    "pull",
+    "build",
+    "create_volume",
+    "restore_volume",
+    "create",
+    "start",
+    "ready",
+    "prepare",
+    "seed",
+    "snapshot",
+    "export_volume",
+    "pool_wait",
+    "reset",
+    "teardown",
+)
+
+
+class Timings:
+    """
+    The timings of a session, it is safe to record them from several
+    threads.
+
+    Every record is a ``dict`` with the ``phase``, the ``target`` it was
+    measured for, usually the name of the container, and the ``seconds``
+    it took.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self.records: List[Dict[str, Any]] = []
+        self._clock = clock
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name: str, target: Optional[str] = None) -> Iterator[None]:
+        """Times the block, whether it raises or not."""
+        start = self._clock()
+        try:
+            yield
+        finally:
+            self.record(name, self._clock() - start, target)
+
+    def record(
+        self, name: str, seconds: float, target: Optional[str] = None
+    ) -> None:
+        with self._lock:
+            self.records.append(
+                {"phase": name, "target": target, "seconds": seconds}
+            )
+
+    def extend(self, records: Iterable[Dict[str, Any]]) -> None:
+        """Adds the records of another process, e.g. an xdist worker."""
+        with self._lock:
+            self.records.extend(records)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """
+        The ``count``, ``total`` and ``max`` seconds of every phase, the
+        known phases come first in the order they happen in.
+        """
+        with self._lock:
+            records = list(self.records)
+        order = {name: i for i, name in enumerate(PHASES)}
+        summary: Dict[str, Dict[str, float]] = {}
+        for record in sorted(
+            records, key=lambda r: order.get(r["phase"], len(order))
+        ):
+            phase = summary.setdefault(
+                record["phase"], {"count": 0, "total": 0.0, "max": 0.0}
+            )
+            phase["count"] += 1
+            phase["total"] += record["seconds"]
+            phase["max"] = max(phase["max"], record["seconds"])
+        return summary
+
+    def to_json(self) -> str:
+        with self._lock:
+            records = list(self.records)
+        return json.dumps(
+            {"phases": self.summary(), "records": records}, indent=2
+        )
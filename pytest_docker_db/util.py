@@ -1,6 +1,18 @@
 import errno
+import hashlib
+import mmap
 import os
+import stat
 import sys
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional, Union
+from urllib.parse import urlparse
+
+if sys.platform == "win32":
+    import msvcrt
+else:
+    import fcntl
 
 # Sadly, Python fails to provide the following magic number for us.
 ERROR_INVALID_NAME = 123
@@ -82,3 +94,129 @@ def is_pathname_valid(pathname: str) -> bool:
     # pathname itself are valid.
     else:
         return True
+
+
+def is_named_volume(source: str) -> bool:
+    """
+    `True` if the source of a volume, e.g. ``pgdata`` in
+    ``pgdata:/var/lib/postgresql/data``, is the name of a docker volume;
+    `False` if it is a host path.
+    """
+    if not source or source.startswith((".", "~")):
+        return False
+    return "/" not in source and "\\" not in source
+
+
+def to_bool(val: str) -> bool:
+    """Converts an ini style boolean, e.g. ``true``, ``no`` or ``1``."""
+    val = val.strip().lower()
+    if val in ("y", "yes", "t", "true", "on", "1"):
+        return True
+    if val in ("n", "no", "f", "false", "off", "0", ""):
+        return False
+    raise ValueError(f"Invalid boolean value {val!r}")
+
+
+def docker_host(base_url: str) -> str:
+    """
+    Returns the host name that ports published by the docker daemon at
+    ``base_url`` can be reached on.
+
+    Unix sockets and named pipes mean the daemon is local, for ``tcp://``
+    daemons the published ports are on the daemon's host.
+    """
+    url = urlparse(base_url)
+    if url.scheme.startswith("http+") or not url.hostname:
+        return "localhost"
+    return url.hostname
+
+
+def xdist_worker_id() -> Optional[str]:
+    """
+    Returns the id of the current pytest-xdist worker, e.g. ``gw0``, or
+    `None` if the tests are not being run by xdist.
+    """
+    return os.environ.get("PYTEST_XDIST_WORKER")
+
+
+@contextmanager
+def file_lock(path: Union[str, Path]) -> Iterator[None]:
+    """
+    An exclusive, blocking, inter-process lock on the file at ``path``.
+
+    The file is created if it doesn't exist and it is never removed.
+    """
+    with open(path, "a+") as f:
+        if sys.platform == "win32":
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        else:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if sys.platform == "win32":
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def context_digest(path: str, dockerfile: Optional[str] = None) -> str:
+    """
+    Returns a sha256 hex digest of a docker build context.
+
+    Only the files docker would send to the daemon are hashed, i.e. the
+    patterns in the context's ``.dockerignore`` are respected. The digest
+    covers the relative path, the executable bit and the content of every
+    file as well as the target of every symlink.
+
+    :param path: the build context directory.
+    :param dockerfile: the Dockerfile, relative to ``path``.
+    """
+    from docker.utils.build import exclude_paths
+
+    patterns = []
+    dockerignore = os.path.join(path, ".dockerignore")
+    if os.path.exists(dockerignore):
+        with open(dockerignore) as f:
+            patterns = [
+                line.strip()
+                for line in f.read().splitlines()
+                if line.strip() and not line.strip().startswith("#")
+            ]
+
+    digest = hashlib.sha256()
+    digest.update(f"dockerfile:{dockerfile or 'Dockerfile'}\0".encode())
+    for rel in sorted(exclude_paths(path, patterns, dockerfile=dockerfile)):
+        full = os.path.join(path, rel)
+        mode = os.lstat(full).st_mode
+        name = rel.replace(os.sep, "/")
+        if stat.S_ISLNK(mode):
+            digest.update(f"link:{name}:{os.readlink(full)}\0".encode())
+        elif stat.S_ISREG(mode):
+            executable = bool(mode & stat.S_IXUSR)
+            digest.update(f"file:{name}:{executable}\0".encode())
+            with open(full, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 16), b""):
+                    digest.update(chunk)
+        else:
+            digest.update(f"dir:{name}\0".encode())
+    return digest.hexdigest()
+
+
+def read_chunks(path: str, size: int = 1 << 20) -> Iterator[bytes]:
+    """
+    Reads the file at ``path`` in chunks of ``size`` bytes from a memory
+    map, the file is never read into memory as a whole.
+    """
+    with open(path, "rb") as f:
+        try:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # empty files can't be mapped
+            return
+        with mapped:
+            for start in range(0, len(mapped), size):
+                end = start + size
+                yield mapped[start:end]
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""
+A cache of the content of named volumes, see ``db-volume-cache``.
+
+After a container was set up for the first time its named volumes are
+exported to gzipped tarballs. A later session that has to create the
+volumes from scratch, e.g. on a fresh CI runner, restores them from the
+tarballs before the database starts, so it neither initializes nor
+prepares the database again.
+
+The tarballs are content addressed, they are stored as
+``<sha256 of the tarball>.tar.gz``. A ref file named after the hash of the
+inputs of the setup, see :func:`pytest_docker_db.snapshot.snapshot_key`,
+points to the tarball of a volume, so that a corrupt or truncated tarball
+is never restored.
+
+The volumes are copied with the Engine API's archive endpoints through a
+helper container that mounts the volume and is never started, this works
+with remote daemons as well.
+"""
+
+import gzip
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+from typing import IO, Iterator, Optional, TYPE_CHECKING
+
+import pytest_docker_db.labels as labels
+import pytest_docker_db.reaper as reaper
+
+if TYPE_CHECKING:
+    from docker import DockerClient
+
+#: the directory in pytest's cache the tarballs are kept in
+CACHE_DIR = "docker-db-volumes"
+#: where the helper container mounts the volume
+MOUNT_PATH = "/volume"
+
+
+class VolumeCacheError(Exception):
+    """Raised when a tarball does not match its digest."""
+
+
+class VolumeCache:
+    """
+    The tarballs in ``path``.
+
+    :param path: the cache directory, e.g. ``config.cache.mkdir(CACHE_DIR)``.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+
+    def lookup(self, key: str) -> Optional[Path]:
+        """:return: the tarball for ``key``, if there is one."""
+        try:
+            digest = (self.path / f"{key}.ref").read_text().strip()
+        except FileNotFoundError:
+            return None
+        tarball = self._blob(digest)
+        return tarball if tarball.exists() else None
+
+    def store(self, key: str, stream: Iterator[bytes]) -> Path:
+        """
+        Compresses the tar ``stream`` into the cache and points ``key`` to
+        it. Concurrent sessions may store the same key, the files are only
+        ever replaced atomically.
+
+        :return: the tarball.
+        """
+        digest = hashlib.sha256()
+        fd, tmp = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                writer = _HashingWriter(f, digest)
+                # mtime=0, the same content is the same tarball
+                with gzip.GzipFile(fileobj=writer, mode="wb", mtime=0) as gz:
+                    for chunk in stream:
+                        gz.write(chunk)
+            tarball = self._blob(digest.hexdigest())
+            os.replace(tmp, tarball)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        _write_atomic(self.path / f"{key}.ref", digest.hexdigest())
+        return tarball
+
+    def verify(self, tarball: Path) -> None:
+        """
+        :raises VolumeCacheError: if the tarball's content does not match
+            its name.
+        """
+        digest = hashlib.sha256()
+        with open(tarball, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        if f"{digest.hexdigest()}.tar.gz" != tarball.name:
+            raise VolumeCacheError(f"{tarball} is corrupt.")
+
+    def _blob(self, digest: str) -> Path:
+        return self.path / f"{digest}.tar.gz"
+
+
+def export_volume(
+    _docker: "DockerClient",
+    volume: str,
+    image: str,
+    cache: VolumeCache,
+    key: str,
+) -> Path:
+    """
+    Exports the content of ``volume`` into the ``cache``. The containers
+    that use the volume should be stopped, so that it is consistent.
+
+    :param image: the image of the helper container, any local image will
+        do, it is never started.
+    """
+    helper = _helper(_docker, volume, image)
+    try:
+        # the entries of the archive are relative to /, e.g. volume/PG_VERSION
+        stream, _ = helper.get_archive(MOUNT_PATH)
+        return cache.store(key, stream)
+    finally:
+        helper.remove(v=False, force=True)
+
+
+def restore_volume(
+    _docker: "DockerClient", volume: str, image: str, tarball: Path
+) -> None:
+    """
+    Extracts ``tarball`` into ``volume``. The daemon keeps the owners and
+    permissions of the files, so the database can use them.
+    """
+    helper = _helper(_docker, volume, image)
+    try:
+        with open(tarball, "rb") as f:
+            # the daemon decompresses gzipped archives on its own
+            helper.put_archive("/", f)
+    finally:
+        helper.remove(v=False, force=True)
+
+
+def _helper(_docker: "DockerClient", volume: str, image: str):
+    return _docker.containers.create(
+        image=image,
+        entrypoint=["true"],
+        volumes=[f"{volume}:{MOUNT_PATH}:rw"],
+        labels={labels.MANAGED: "true", **reaper.owner_labels()},
+    )
+
+
+class _HashingWriter:
+    """A file object that hashes everything that is written to it."""
+
+    def __init__(self, f: IO[bytes], digest):
+        self._f = f
+        self._digest = digest
+
+    def write(self, data: bytes) -> int:
+        self._digest.update(data)
+        return self._f.write(data)
+
+    def flush(self) -> None:
+        self._f.flush()
+
+
+def _write_atomic(path: Path, text: str) -> None:
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        f.write(text)
+    os.replace(tmp, path)
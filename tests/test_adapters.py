@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+from pytest_docker_db import adapters
+
+
+def test_changed_tables():
+    before = {"a": (0, None), "b": (2, 2), "c": (1, 5)}
+    after = {"a": (0, None), "b": (2, 4), "c": (3, 7), "d": (0, None)}
+
+    assert adapters.Adapter.changed_tables(before, after) == ["b", "c", "d"]
+
+
+def test_missing_driver(monkeypatch):
+    monkeypatch.setitem(sys.modules, "pymysql", None)
+
+    adapter = adapters.MySQLAdapter("mysql://root@localhost:3306/app")
+    with pytest.raises(adapters.AdapterError, match="pymysql"):
+        adapter.connect()
+
+
+def test_mysql_connect(monkeypatch):
+    calls = []
+    fake = SimpleNamespace(connect=lambda **kw: calls.append(kw))
+    monkeypatch.setitem(sys.modules, "pymysql", fake)
+
+    adapters.MySQLAdapter("mysql://root:p%40ss@db:3307/app_gw0").connect()
+
+    assert calls == [
+        {
+            "host": "db",
+            "port": 3307,
+            "user": "root",
+            "password": "p@ss",
+            "database": "app_gw0",
+            "autocommit": False,
+        }
+    ]
+
+
+def test_mysql_async_connect(monkeypatch):
+    calls = []
+
+    async def connect(**kw):
+        calls.append(kw)
+
+    monkeypatch.setitem(
+        sys.modules, "aiomysql", SimpleNamespace(connect=connect)
+    )
+
+    adapter = adapters.MySQLAdapter("mysql://root:secret@db:3307/app")
+    asyncio.run(adapter.async_connect())
+
+    assert calls == [
+        {
+            "host": "db",
+            "port": 3307,
+            "user": "root",
+            "password": "secret",
+            "db": "app",
+            "autocommit": False,
+        }
+    ]
+
+
+def test_missing_async_driver(monkeypatch):
+    monkeypatch.setitem(sys.modules, "psycopg", None)
+
+    adapter = adapters.PostgresAdapter("postgresql://postgres@db:5432/app")
+    with pytest.raises(adapters.AdapterError, match="psycopg"):
+        asyncio.run(adapter.async_connect())
+
+
+class _Copy:
+    def __init__(self):
+        self.data = b""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def write(self, chunk):
+        self.data += chunk
+
+
+class _Cursor:
+    def __init__(self):
+        self.copies = []
+        self.executed = []
+
+    def copy(self, sql):
+        self.copies.append((sql, _Copy()))
+        return self.copies[-1][1]
+
+    def execute(self, sql, params=None):
+        self.executed.append((sql, params))
+
+    def close(self):
+        pass
+
+
+class _Psycopg2Cursor:
+    def __init__(self):
+        self.copies = []
+
+    def copy_expert(self, sql, file):
+        data = b""
+        for chunk in iter(lambda: file.read(3), b""):
+            data += chunk
+        self.copies.append((sql, data))
+
+    def close(self):
+        pass
+
+
+@pytest.mark.parametrize("cursor_class", [_Cursor, _Psycopg2Cursor])
+def test_postgres_load_csv(tmp_path, cursor_class):
+    cursor = cursor_class()
+    path = tmp_path / "users.csv"
+    path.write_bytes(b"id,name\n1,alice\n")
+    conn = SimpleNamespace(cursor=lambda: cursor)
+    adapter = adapters.PostgresAdapter("postgresql://postgres@db:5432/app")
+
+    adapter.load_csv(conn, '"users"', ['"id"', '"name"'], str(path))
+
+    sql, data = cursor.copies[0]
+    assert sql == (
+        'COPY "users" ("id", "name") FROM STDIN WITH (FORMAT csv, HEADER true)'
+    )
+    assert getattr(data, "data", data) == b"id,name\n1,alice\n"
+
+
+def test_mysql_load_csv():
+    cursor = _Cursor()
+    conn = SimpleNamespace(cursor=lambda: cursor)
+    adapter = adapters.MySQLAdapter("mysql://root@db:3306/app")
+
+    adapter.load_csv(conn, "`users`", ["`id`", "`name`"], "/seed/users.csv")
+
+    sql, params = cursor.executed[0]
+    assert sql.startswith("LOAD DATA LOCAL INFILE %s INTO TABLE `users` ")
+    assert sql.endswith("IGNORE 1 LINES (`id`, `name`)")
+    assert params == ("/seed/users.csv",)
+
+
+def test_quote():
+    postgres = adapters.PostgresAdapter("postgresql://postgres@db:5432/app")
+    mysql = adapters.MySQLAdapter("mysql://root@db:3306/app")
+
+    assert postgres.quote('public.my"table') == '"public"."my""table"'
+    assert mysql.quote("app.my`table") == "`app`.`my``table`"
@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the asyncio Engine API client and ``async_docker_db``'s life cycle
+against a fake daemon.
+"""
+
+import asyncio
+import json
+import re
+import struct
+from types import SimpleNamespace
+
+import pytest
+
+from pytest_docker_db import aio, labels, plugin, readiness
+
+
+class _FakeDaemon:
+    """
+    Answers requests from ``routes``, a list of ``(method, path regex,
+    handler)``. A handler gets the request and returns the status and the
+    body, a ``list`` body is sent chunked.
+    """
+
+    def __init__(self, routes):
+        self.routes = routes
+        self.requests = []
+
+    async def __aenter__(self):
+        self.server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        port = self.server.sockets[0].getsockname()[1]
+        self.client = aio.AsyncDockerClient(f"tcp://127.0.0.1:{port}")
+        return self
+
+    async def __aexit__(self, *exc):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def _handle(self, reader, writer):
+        method, target, _ = (await reader.readline()).decode().split()
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode().strip()
+            if not line:
+                break
+            key, _, value = line.partition(":")
+            headers[key.lower()] = value.strip()
+        body = await reader.readexactly(int(headers["content-length"]))
+        path, _, query = target.partition("?")
+        request = SimpleNamespace(
+            method=method,
+            path=path,
+            query=query,
+            body=json.loads(body) if body else None,
+        )
+        self.requests.append(request)
+
+        status, payload = 404, {"message": f"{method} {path} is not faked"}
+        for route_method, pattern, handler in self.routes:
+            if route_method == method and re.fullmatch(pattern, path):
+                status, payload = handler(request)
+                break
+
+        head = f"HTTP/1.1 {status} X\r\nContent-Type: application/json\r\n"
+        if isinstance(payload, list):
+            writer.write(f"{head}Transfer-Encoding: chunked\r\n\r\n".encode())
+            for chunk in payload:
+                writer.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+            writer.write(b"0\r\n\r\n")
+        else:
+            data = b"" if payload is None else payload
+            if not isinstance(data, bytes):
+                data = json.dumps(payload).encode()
+            writer.write(
+                f"{head}Content-Length: {len(data)}\r\n\r\n".encode() + data
+            )
+        await writer.drain()
+        writer.close()
+
+
+def _run(routes, coro):
+    async def main():
+        async with _FakeDaemon(routes) as daemon:
+            return daemon, await coro(daemon.client)
+
+    return asyncio.run(main())
+
+
+def test_request():
+    routes = [
+        ("GET", r"/containers/db/json", lambda r: (200, {"Id": "db"})),
+        ("GET", r"/images/.+/json", lambda r: (404, {"message": "no such"})),
+    ]
+
+    async def requests(client):
+        assert await client.inspect("db") == {"Id": "db"}
+        assert not await client.image_exists("postgres:15")
+        with pytest.raises(aio.AsyncDockerError, match="not faked"):
+            await client.start("db")
+
+    _run(routes, requests)
+
+
+def test_chunked_pull_errors():
+    stream = [b'{"status": "Pulling"}\n', b'{"error": "manifest unknown"}\n']
+    routes = [("POST", r"/images/create", lambda r: (200, stream))]
+
+    async def pull(client):
+        with pytest.raises(aio.AsyncDockerError, match="manifest unknown"):
+            await client.pull("postgres:nope")
+
+    daemon, _ = _run(routes, pull)
+
+    assert daemon.requests[0].query == "fromImage=postgres&tag=nope"
+
+
+def test_logs_are_demuxed():
+    frames = b"".join(
+        struct.pack(">BxxxL", stream, len(text)) + text
+        for stream, text in [(1, b"starting\n"), (2, b"ready\n")]
+    )
+    routes = [("GET", r"/containers/db/logs", lambda r: (200, frames))]
+
+    _, logs = _run(routes, lambda client: client.logs("db"))
+
+    assert logs == "starting\nready\n"
+
+
+@pytest.mark.parametrize(
+    "image, expected",
+    [
+        ("postgres", ("postgres", "latest")),
+        ("postgres:15", ("postgres", "15")),
+        ("localhost:5000/pg:15", ("localhost:5000/pg", "15")),
+        ("localhost:5000/pg", ("localhost:5000/pg", "latest")),
+        ("pg@sha256:abc", ("pg", "sha256:abc")),
+    ],
+)
+def test_split_image(image, expected):
+    assert aio._split_image(image) == expected
+
+
+def _options(**ini):
+    config = SimpleNamespace(
+        getini=lambda key: ini.get(key, ""),
+        getoption=lambda key: None,
+        stash={},
+    )
+    return plugin._DockerDBOptions(SimpleNamespace(config=config))
+
+
+class _Engine:
+    """A fake daemon with one database whose port is ``ready_port``."""
+
+    def __init__(self, ready_port, conflicts=0):
+        self.ready_port = ready_port
+        self.conflicts = conflicts
+        self.created = None
+        self.state = {"Status": "created", "Running": False}
+
+    @property
+    def routes(self):
+        return [
+            ("GET", r"/containers/json", lambda r: (200, [])),
+            ("GET", r"/images/.+/json", lambda r: (200, {})),
+            ("POST", r"/containers/create", self.create),
+            ("POST", r"/containers/db/start", self.start),
+            ("GET", r"/containers/db/json", self.inspect),
+            ("POST", r"/containers/db/kill", lambda r: (204, None)),
+            ("DELETE", r"/containers/db", lambda r: (204, None)),
+        ]
+
+    def create(self, request):
+        self.created = request.body
+        return 201, {"Id": "db"}
+
+    def start(self, request):
+        if self.conflicts:
+            self.conflicts -= 1
+            return 500, {"message": "port is already allocated"}
+        self.state = {"Status": "running", "Running": True}
+        return 204, None
+
+    def inspect(self, request):
+        ports = {"5432/tcp": [{"HostPort": str(self.ready_port)}]}
+        return 200, {
+            "Id": "db",
+            "Name": "/test-db",
+            "State": self.state,
+            "Config": {},
+            "NetworkSettings": {"Ports": ports},
+        }
+
+
+def test_start_container():
+    async def main():
+        # the "database" sends a byte as soon as it accepts a connection
+        async def accept(reader, writer):
+            writer.write(b"R")
+            await writer.drain()
+            writer.close()
+
+        db = await asyncio.start_server(accept, "127.0.0.1", 0)
+        engine = _Engine(db.sockets[0].getsockname()[1], conflicts=1)
+        opts = _options(
+            **{
+                "db-image": "memcached:1",
+                "db-name": "test-db",
+                "db-port": "5432",
+                "db-ready-timeout": "5",
+            }
+        )
+        async with _FakeDaemon(engine.routes) as daemon:
+            container = await plugin._async_start_container(
+                daemon.client, opts
+            )
+            await plugin._async_teardown_container(
+                daemon.client, container.id, opts
+            )
+        db.close()
+        return engine, daemon, container, opts
+
+    engine, daemon, container, opts = asyncio.run(main())
+
+    assert container.status == "running"
+    host_config = engine.created["HostConfig"]
+    assert host_config["PortBindings"] == {"5432/tcp": [{"HostPort": ""}]}
+    assert engine.created["Labels"][labels.MANAGED] == "true"
+    calls = [(r.method, r.path) for r in daemon.requests]
+    assert calls.count(("POST", "/containers/db/start")) == 2
+    assert calls[-2:] == [
+        ("POST", "/containers/db/kill"),
+        ("DELETE", "/containers/db"),
+    ]
+    phases = [r["phase"] for r in plugin._timings(opts.config).records]
+    assert phases == ["lookup", "pull", "create", "start", "ready", "teardown"]
+
+
+def test_wait_until_ready_stopped_container():
+    routes = [
+        (
+            "GET",
+            r"/containers/db/json",
+            lambda r: (200, {"Id": "db", "State": {"Status": "exited"}}),
+        ),
+        ("GET", r"/containers/db/logs", lambda r: (200, b"crashed")),
+    ]
+
+    async def wait(client):
+        container = aio.Container(client, {"Id": "db"})
+        with pytest.raises(readiness.ReadinessError, match="crashed"):
+            await aio.wait_until_ready(container, [], timeout=1)
+
+    _run(routes, wait)
+
+
+def test_unsupported_options():
+    opts = _options(**{"db-image": "postgres:15", "db-reuse": True})
+
+    with pytest.raises(pytest.fail.Exception, match="db-reuse"):
+        asyncio.run(plugin._async_start_container(None, opts))
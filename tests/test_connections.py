@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import threading
+
+import pytest
+
+from pytest_docker_db import connections, timing
+
+
+class _Connection:
+    def __init__(self, broken=False):
+        self.broken = broken
+        self.rollbacks = 0
+        self.closed = False
+
+    def rollback(self):
+        if self.broken:
+            raise RuntimeError("connection lost")
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = True
+
+
+class _Connect:
+    def __init__(self):
+        self.opened = []
+
+    def __call__(self):
+        conn = _Connection()
+        self.opened.append(conn)
+        return conn
+
+
+def test_prewarm():
+    connect = _Connect()
+    pool = connections.ConnectionPool(connect, size=3)
+
+    pool.prewarm()
+    pool.prewarm()
+
+    assert len(connect.opened) == 3
+    assert pool.idle == 3
+
+
+def test_acquire_and_release():
+    connect = _Connect()
+    timings = timing.Timings()
+    pool = connections.ConnectionPool(
+        connect, size=2, timings=timings, target="db"
+    )
+
+    with pool.connection() as first:
+        pass
+    with pool.connection() as second:
+        pass
+
+    # the released connection is handed out again
+    assert first is second
+    assert len(connect.opened) == 1
+    assert first.rollbacks == 2
+    assert [r["phase"] for r in timings.records] == ["pool_wait"] * 2
+    assert timings.records[0]["target"] == "db"
+
+
+def test_acquire_waits_for_release():
+    pool = connections.ConnectionPool(_Connect(), size=1)
+    conn = pool.acquire()
+    threading.Timer(0.05, pool.release, args=(conn,)).start()
+
+    assert pool.acquire(timeout=5) is conn
+
+
+def test_acquire_timeout():
+    pool = connections.ConnectionPool(_Connect(), size=1)
+    pool.acquire()
+
+    with pytest.raises(connections.ConnectionPoolError, match="in use"):
+        pool.acquire(timeout=0.01)
+
+
+def test_broken_connection_is_replaced():
+    connect = _Connect()
+    pool = connections.ConnectionPool(connect, size=1)
+    conn = pool.acquire()
+    conn.broken = True
+
+    pool.release(conn)
+
+    assert conn.closed
+    assert pool.acquire(timeout=0) is not conn
+    assert len(connect.opened) == 2
+
+
+def test_failed_connect_frees_the_slot():
+    attempts = []
+
+    def connect():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RuntimeError("refused")
+        return _Connection()
+
+    pool = connections.ConnectionPool(connect, size=1)
+    with pytest.raises(RuntimeError):
+        pool.acquire()
+
+    assert pool.acquire(timeout=0) is not None
+
+
+def test_close():
+    connect = _Connect()
+    pool = connections.ConnectionPool(connect, size=2)
+    pool.prewarm()
+    in_use = pool.acquire()
+
+    pool.close()
+    pool.release(in_use)
+
+    assert all(conn.closed for conn in connect.opened)
+    with pytest.raises(connections.ConnectionPoolError, match="closed"):
+        pool.acquire()
+
+
+class _AsyncConnection(_Connection):
+    async def rollback(self):
+        super().rollback()
+
+    async def close(self):
+        super().close()
+
+
+class _AsyncConnect(_Connect):
+    async def __call__(self):
+        conn = _AsyncConnection()
+        self.opened.append(conn)
+        return conn
+
+
+def test_async_pool():
+    connect = _AsyncConnect()
+    timings = timing.Timings()
+    pool = connections.AsyncConnectionPool(connect, size=2, timings=timings)
+
+    async def run():
+        await pool.prewarm()
+        async with pool.connection() as first:
+            async with pool.connection() as second:
+                assert first is not second
+                with pytest.raises(connections.ConnectionPoolError):
+                    async with pool.connection(timeout=0.01):
+                        pass
+        await pool.aclose()
+
+    asyncio.run(run())
+
+    assert len(connect.opened) == 2
+    assert all(conn.closed for conn in connect.opened)
+    assert [r["phase"] for r in timings.records] == ["pool_wait"] * 3
+
+
+def test_async_pool_drops_connections_of_other_loops():
+    connect = _AsyncConnect()
+    pool = connections.AsyncConnectionPool(connect, size=1)
+
+    async def use():
+        async with pool.connection():
+            pass
+
+    asyncio.run(use())
+    asyncio.run(use())
+
+    assert len(connect.opened) == 2
@@ -1,9 +1,16 @@
 # -*- coding: utf-8 -*-
+import json
 import os
+import uuid
 from pathlib import Path
 from shutil import copy2
 from typing import TYPE_CHECKING
 
+import pytest
+
+from pytest_docker_db.plugin import BUILD_REPOSITORY
+from pytest_docker_db.util import context_digest
+
 if TYPE_CHECKING:
     from _pytest.pytester import Testdir
     from docker import Client
@@ -80,6 +87,10 @@ def test_no_image(testdir):
     assert result.ret == 1
 
 
+def _build_tag(context: str) -> str:
+    return f"{BUILD_REPOSITORY}:{context_digest(context, 'Dockerfile')[:16]}"
+
+
 def _make_postgres_pyfile(
     testdir,
     host_port,
@@ -253,9 +264,17 @@ def test_dockerfile(testdir: "Testdir"):
     Test using a custom Dockerfile.
     """
     db_name = "test-dockerfile"
-    image_name = "test-dockerfile"
     host_port = "5351"
     vol_name = "test-dockerfile-vol"
+    docker_file = """
+    FROM postgres:latest
+    ENV POSTGRES_PASSWORD foo
+    """
+    _ = testdir.makefile("", Dockerfile=docker_file)  # noqa: F841
+    testdir.makefile(
+        "", **{".dockerignore": "__pycache__\n.pytest_cache\ntest_*.py"}
+    )
+    image_name = _build_tag(str(testdir.tmpdir))
     _make_postgres_pyfile(
         testdir,
         host_port=host_port,
@@ -263,11 +282,6 @@ def test_dockerfile(testdir: "Testdir"):
         volume=vol_name,
         image_name=image_name,
     )
-    docker_file = """
-    FROM postgres:latest
-    ENV POSTGRES_PASSWORD foo
-    """
-    _ = testdir.makefile("", Dockerfile=docker_file)  # noqa: F841
 
     result = testdir.runpytest(
         "--db-dockerfile=Dockerfile",
@@ -286,16 +300,8 @@ def test_docker_context(testdir: "Testdir"):
     Test using a custom Dockerfile.
     """
     db_name = "test-docker-context"
-    image_name = "test-docker-context"
     host_port = "5356"
     vol_name = "test-dockerfile-vol-2"
-    _make_postgres_pyfile(
-        testdir,
-        host_port=host_port,
-        container_name=db_name,
-        volume=vol_name,
-        image_name=image_name,
-    )
     docker_dir = testdir.mkdir("test-docker")
     dockerfile = docker_dir / "Dockerfile"
     create_users = docker_dir / "create-user.sh"
@@ -322,6 +328,13 @@ def test_docker_context(testdir: "Testdir"):
     with open(create_users, "w") as f:
         f.writelines(create_users_contents)
     # create_users.write_text(create_users_contents)
+    _make_postgres_pyfile(
+        testdir,
+        host_port=host_port,
+        container_name=db_name,
+        volume=vol_name,
+        image_name=_build_tag(str(docker_dir)),
+    )
 
     result = testdir.runpytest(
         "--db-dockerfile=Dockerfile",
@@ -336,6 +349,478 @@ def test_docker_context(testdir: "Testdir"):
     assert result.ret == 0
 
 
+def test_dockerfile_build_cache(testdir: "Testdir", _docker: "Client"):
+    """
+    Ensure that an unchanged build context is only built once.
+    """
+    testdir.makefile("", Dockerfile="FROM postgres:latest")
+    testdir.makefile("", **{".dockerignore": "__pycache__\n.pytest_cache"})
+    testdir.makepyfile(
+        """
+            def test_sth(docker_db):
+                pass
+            """
+    )
+    args = (
+        "--db-dockerfile=Dockerfile",
+        "--db-port=5432",
+        "--db-docker-env-vars=POSTGRES_PASSWORD=foo",
+    )
+
+    assert testdir.runpytest(*args).ret == 0
+    tags = {t for i in _docker.images.list() for t in i.tags}
+    assert testdir.runpytest(*args).ret == 0
+
+    assert tags == {t for i in _docker.images.list() for t in i.tags}
+
+
+def test_ready_probes(testdir: "Testdir"):
+    """
+    Ensure that the fixture only returns once the database accepts
+    connections.
+    """
+    testdir.makepyfile(
+        """
+            def test_ready(docker_db):
+                res = docker_db.exec_run('pg_isready -U postgres')
+                assert res.exit_code == 0
+            """
+    )
+
+    result = testdir.runpytest(
+        "--db-image=postgres:latest",
+        "--db-name=test-postgres-ready",
+        "--db-port=5432",
+        "--db-docker-env-vars=POSTGRES_PASSWORD=foo",
+        "--db-ready-log=ready to accept connections",
+        "--db-ready-cmd=pg_isready -U postgres",
+        "-v",
+    )
+
+    assert result.ret == 0
+
+
+def test_ready_timeout(testdir: "Testdir"):
+    """
+    Ensure that the tests fail if the database never becomes ready.
+    """
+    testdir.makepyfile(
+        """
+            def test_never_ready(docker_db):
+                pass
+            """
+    )
+
+    result = testdir.runpytest(
+        "--db-image=postgres:latest",
+        "--db-name=test-postgres-never-ready",
+        "--db-port=5432",
+        "--db-docker-env-vars=POSTGRES_PASSWORD=foo",
+        "--db-ready-log=this will never be logged",
+        "--db-ready-timeout=3",
+        "-v",
+    )
+
+    result.stdout.fnmatch_lines(["*was not ready after 3.0s*"])
+    assert result.ret == 1
+
+
+def test_xdist_shared_container(testdir: "Testdir"):
+    """
+    Ensure that all xdist workers use the same container in 'shared' mode.
+    """
+    pytest.importorskip("xdist")
+    testdir.makepyfile(
+        """
+            import pytest
+
+            @pytest.mark.parametrize('i', range(8))
+            def test_shared(docker_db, i, tmp_path_factory):
+                root = tmp_path_factory.getbasetemp().parent
+                (root / f'db-{docker_db.id}-{i}').touch()
+            """
+    )
+
+    result = testdir.runpytest(
+        "--db-image=postgres:latest",
+        "--db-port=5432",
+        "--db-docker-env-vars=POSTGRES_PASSWORD=foo",
+        "--db-xdist-mode=shared",
+        "-n",
+        "4",
+        "--basetemp",
+        str(testdir.tmpdir / "basetemp"),
+    )
+
+    assert result.ret == 0
+    touched = (testdir.tmpdir / "basetemp").listdir("db-*")
+    assert len({p.basename.rsplit("-", 1)[0] for p in touched}) == 1
+
+
+def test_xdist_worker_databases(testdir: "Testdir"):
+    """
+    Ensure that every xdist worker gets its own database in one container.
+    """
+    pytest.importorskip("xdist")
+    testdir.makepyfile(
+        """
+            import os
+
+            def test_worker_database(docker_db, docker_db_dsn):
+                worker = os.environ['PYTEST_XDIST_WORKER']
+                assert docker_db_dsn.endswith(f'/postgres_{worker}')
+                res = docker_db.exec_run(
+                    ['psql', '-U', 'postgres', '-d', f'postgres_{worker}',
+                     '-c', 'SELECT 1']
+                )
+                assert res.exit_code == 0
+            """
+    )
+
+    result = testdir.runpytest(
+        "--db-image=postgres:latest",
+        "--db-port=5432",
+        "--db-docker-env-vars=POSTGRES_PASSWORD=foo",
+        "--db-xdist-mode=database",
+        "-n",
+        "2",
+    )
+
+    assert result.ret == 0
+
+
+def test_snapshot(testdir: "Testdir", _docker: "Client"):
+    """
+    Ensure that the prepare hook only runs until a snapshot exists.
+    """
+    testdir.makeconftest(
+        """
+            def pytest_docker_db_prepare(container, config):
+                print('PREPARING')
+                res = container.exec_run(
+                    ['psql', '-U', 'postgres', '-c',
+                     'CREATE TABLE migrated (id int)']
+                )
+                assert res.exit_code == 0
+            """
+    )
+    testdir.makepyfile(
+        """
+            def test_migrated(docker_db):
+                res = docker_db.exec_run(
+                    ['psql', '-U', 'postgres', '-c',
+                     'SELECT * FROM migrated']
+                )
+                assert res.exit_code == 0
+            """
+    )
+    testdir.mkdir("migrations").join("0001.sql").write("-- a migration")
+    args = (
+        "--db-image=postgres:latest",
+        "--db-port=5432",
+        "--db-docker-env-vars=POSTGRES_PASSWORD=foo",
+        "--db-snapshot-files=migrations/*.sql",
+        "-s",
+    )
+
+    first = testdir.runpytest(*args)
+    second = testdir.runpytest(*args)
+
+    assert first.ret == 0
+    first.stdout.fnmatch_lines(["*PREPARING*"])
+    assert second.ret == 0
+    second.stdout.no_fnmatch_line("*PREPARING*")
+
+    for image in _docker.images.list("pytest-docker-db-snapshot"):
+        _docker.images.remove(image.id, force=True)
+
+
+@pytest.mark.parametrize("strategy", ["transaction", "truncate"])
+def test_transaction_rollback(testdir: "Testdir", strategy):
+    """
+    Ensure that writes made by a test are undone before the next test.
+    """
+    pytest.importorskip("psycopg")
+    testdir.makeconftest(
+        """
+            def pytest_docker_db_prepare(container, config):
+                container.exec_run(
+                    ['psql', '-U', 'postgres', '-c',
+                     'CREATE TABLE t (id serial primary key)']
+                )
+            """
+    )
+    testdir.makepyfile(
+        """
+            import pytest
+
+            @pytest.mark.parametrize('i', range(3))
+            def test_insert(docker_db_transaction, i):
+                cur = docker_db_transaction.cursor()
+                cur.execute('INSERT INTO t DEFAULT VALUES')
+                cur.execute('SELECT count(*) FROM t')
+                assert cur.fetchone() == (1,)
+            """
+    )
+
+    result = testdir.runpytest(
+        "--db-image=postgres:latest",
+        "--db-port=5432",
+        "--db-docker-env-vars=POSTGRES_PASSWORD=foo",
+        f"--db-reset-strategy={strategy}",
+    )
+
+    assert result.ret == 0
+
+
+def test_connection_pool(testdir: "Testdir"):
+    """
+    Ensure that the tests share the pool's connections.
+    """
+    pytest.importorskip("psycopg")
+    testdir.makepyfile(
+        """
+            import pytest
+
+            @pytest.mark.parametrize('i', range(3))
+            def test_backend(docker_db_connection, docker_db_pool, i):
+                cur = docker_db_connection.cursor()
+                cur.execute('SELECT pg_backend_pid()')
+                print('BACKEND', cur.fetchone()[0])
+                assert docker_db_pool.idle == 1
+            """
+    )
+
+    result = testdir.runpytest(
+        "--db-image=postgres:latest",
+        "--db-port=5432",
+        "--db-docker-env-vars=POSTGRES_PASSWORD=foo",
+        "--db-conn-pool-size=2",
+        "-s",
+    )
+
+    assert result.ret == 0
+    backends = {
+        line.split()[-1] for line in result.outlines if "BACKEND" in line
+    }
+    assert len(backends) == 1
+    result.stdout.fnmatch_lines(["*pool_wait*"])
+
+
+def test_async_connection_pool(testdir: "Testdir"):
+    """
+    Ensure that the asyncio pool's connections are opened before the tests.
+    """
+    pytest.importorskip("pytest_asyncio")
+    pytest.importorskip("psycopg")
+    testdir.makepyfile(
+        """
+            import pytest
+
+            @pytest.mark.asyncio(loop_scope='session')
+            async def test_prewarmed(docker_db_async_pool):
+                assert docker_db_async_pool.idle == 2
+                async with docker_db_async_pool.connection() as conn:
+                    await conn.execute('SELECT 1')
+            """
+    )
+
+    result = testdir.runpytest(
+        "--db-image=postgres:latest",
+        "--db-port=5432",
+        "--db-docker-env-vars=POSTGRES_PASSWORD=foo",
+        "--db-conn-pool-size=2",
+    )
+
+    assert result.ret == 0
+
+
+def test_seed(testdir: "Testdir", _docker: "Client"):
+    """
+    Ensure that seed data is loaded, and skipped in a reused container.
+    """
+    pytest.importorskip("psycopg")
+    seed_dir = testdir.mkdir("seed")
+    seed_dir.join("schema.sql").write(
+        "CREATE TABLE IF NOT EXISTS users (id int, name text);"
+    )
+    seed_dir.join("users.csv").write("id,name\n1,alice\n2,bob\n")
+    testdir.makepyfile(
+        """
+            def test_users(docker_db_connection):
+                cur = docker_db_connection.cursor()
+                cur.execute('SELECT count(*) FROM users')
+                assert cur.fetchone() == (2,)
+            """
+    )
+    args = (
+        "--db-image=postgres:latest",
+        "--db-name=test-postgres-seed",
+        "--db-port=5432",
+        "--db-docker-env-vars=POSTGRES_PASSWORD=foo",
+        "--db-seed=seed/*",
+        "--db-reuse",
+        "--db-timings-json=timings.json",
+    )
+
+    for _ in range(2):
+        result = testdir.runpytest(*args)
+        assert result.ret == 0
+
+    with open(testdir.tmpdir.join("timings.json")) as f:
+        assert json.load(f)["phases"]["seed"]["count"] == 1
+
+    _docker.containers.get("test-postgres-seed").remove(force=True)
+
+
+def test_reuse(testdir: "Testdir", _docker: "Client"):
+    """
+    Ensure that a container is reused until its options change.
+    """
+    db_name = "test-postgres-reuse"
+    testdir.makepyfile(
+        """
+            def test_print_id(docker_db):
+                print('CONTAINER', docker_db.id)
+            """
+    )
+
+    def run(password):
+        result = testdir.runpytest(
+            "--db-image=postgres:latest",
+            f"--db-name={db_name}",
+            "--db-port=5432",
+            f"--db-docker-env-vars=POSTGRES_PASSWORD={password}",
+            "--db-reuse",
+            "-s",
+        )
+        assert result.ret == 0
+        return _docker.containers.get(db_name).id
+
+    first = run("foo")
+    assert first == run("foo")
+    assert first != run("bar")
+
+    _docker.containers.get(db_name).remove(force=True)
+
+
+def test_services(testdir: "Testdir"):
+    """
+    Ensure that every configured service gets its own container.
+    """
+    testdir.makeini(
+        """
+            [pytest]
+            db-ready-timeout = 60
+
+            [docker-db:postgres]
+            db-image = postgres:latest
+            db-port = 5432
+            db-docker-env-vars = POSTGRES_PASSWORD=foo
+
+            [docker-db:redis]
+            db-image = redis:latest
+            db-port = 6379
+            db-ready-cmd = redis-cli ping
+            """
+    )
+    testdir.makepyfile(
+        """
+            def test_services(docker_dbs):
+                assert set(docker_dbs) == {'postgres', 'redis'}
+                pg = docker_dbs['postgres'].exec_run('pg_isready -U postgres')
+                assert pg.exit_code == 0
+                redis = docker_dbs['redis'].exec_run('redis-cli ping')
+                assert redis.output.strip() == b'PONG'
+            """
+    )
+
+    result = testdir.runpytest("-v")
+
+    assert result.ret == 0
+
+
+def test_prewarm(testdir: "Testdir", _docker: "Client"):
+    """
+    Ensure that a prewarmed container is handed to docker_db.
+    """
+    db_name = "test-postgres-prewarm"
+    testdir.makepyfile(
+        """
+            def test_prewarmed(docker_db):
+                assert docker_db.name == 'test-postgres-prewarm'
+                assert docker_db.status == 'running'
+            """
+    )
+
+    result = testdir.runpytest(
+        "--db-image=postgres:latest",
+        f"--db-name={db_name}",
+        "--db-port=5432",
+        "--db-docker-env-vars=POSTGRES_PASSWORD=foo",
+        "--db-prewarm",
+        "-v",
+    )
+
+    assert result.ret == 0
+    assert not _docker.containers.list(all=True, filters={"name": db_name})
+
+
+def test_prewarm_prepare_hook(testdir: "Testdir"):
+    """
+    Ensure that a prepare hook in a conftest file that is collected after the
+    container was prewarmed is called.
+    """
+    sub = testdir.mkpydir("sub")
+    sub.join("conftest.py").write(
+        """
+def pytest_docker_db_prepare(container, config):
+    print('PREPARING')
+"""
+    )
+    sub.join("test_prepared.py").write(
+        """
+def test_prepared(docker_db):
+    pass
+"""
+    )
+
+    result = testdir.runpytest(
+        "--db-image=postgres:latest",
+        "--db-port=5432",
+        "--db-docker-env-vars=POSTGRES_PASSWORD=foo",
+        "--db-prewarm",
+        "-s",
+    )
+
+    assert result.ret == 0
+    result.stdout.fnmatch_lines(["*PREPARING*"])
+
+
+def test_prewarm_unused(testdir: "Testdir", _docker: "Client"):
+    """
+    Ensure that no container is prewarmed when no collected test uses it.
+    """
+    db_name = "test-postgres-prewarm-unused"
+    testdir.makepyfile(
+        """
+            def test_no_db():
+                pass
+            """
+    )
+
+    result = testdir.runpytest(
+        "--db-image=postgres:latest",
+        f"--db-name={db_name}",
+        "--db-port=5432",
+        "--db-docker-env-vars=POSTGRES_PASSWORD=foo",
+        "--db-prewarm",
+    )
+
+    assert result.ret == 0
+    assert not _docker.containers.list(all=True, filters={"name": db_name})
+
+
 # @pytest.mark.skip
 # def test_help_message(testdir):
 #     result = testdir.runpytest(
@@ -346,3 +831,126 @@ def test_docker_context(testdir: "Testdir"):
 #     'docker-db:',
 #     '*--foo=DEST_FOO*Set the value for the fixture "bar".',
 # ])
+
+
+def test_timings(testdir: "Testdir"):
+    testdir.makeconftest(
+        """
+            import json
+
+            def pytest_docker_db_timings(timings, config):
+                with open("hook.json", "w") as f:
+                    json.dump(timings.summary(), f)
+        """
+    )
+    testdir.makepyfile(
+        """
+            def test_timed(docker_db):
+                assert docker_db is not None
+        """
+    )
+
+    result = testdir.runpytest(
+        "--db-image=postgres:latest",
+        "--db-port=5432",
+        "--db-docker-env-vars=POSTGRES_PASSWORD=foo",
+        "--db-timings-json=timings.json",
+    )
+
+    assert result.ret == 0
+    result.stdout.fnmatch_lines(
+        ["*docker-db timings*", "ready*s total*s max*1x", "teardown*1x"]
+    )
+    phases = json.loads((testdir.tmpdir / "timings.json").read())["phases"]
+    assert {"lookup", "create", "start", "ready", "teardown"} <= set(phases)
+    hook = json.loads((testdir.tmpdir / "hook.json").read())
+    assert hook == phases
+
+
+def test_factory_scope(testdir: "Testdir"):
+    """
+    Ensure that every module gets the same container with a reset database.
+    """
+    testdir.makeconftest(
+        """
+            def psql(container, sql):
+                result = container.exec_run(
+                    ['psql', '-U', 'postgres', '-tA', '-c', sql]
+                )
+                assert result.exit_code == 0, result.output
+                return result.output.decode().strip()
+        """
+    )
+    for module in ("test_first", "test_second"):
+        testdir.makepyfile(**{module: """
+                from conftest import psql
+
+                def test_write(docker_db_factory):
+                    container = docker_db_factory()
+                    print('CONTAINER', container.id)
+                    psql(container, 'CREATE TABLE t (id int)')
+                    psql(container, 'INSERT INTO t VALUES (1)')
+
+                def test_same_scope(docker_db_factory):
+                    container = docker_db_factory()
+                    assert psql(container, 'SELECT count(*) FROM t') == '1'
+            """})
+
+    result = testdir.runpytest(
+        "--db-image=postgres:latest",
+        "--db-port=5432",
+        "--db-docker-env-vars=POSTGRES_PASSWORD=foo",
+        "--db-scope=module",
+        "-s",
+    )
+
+    assert result.ret == 0
+    containers = {
+        line.split()[-1] for line in result.outlines if "CONTAINER" in line
+    }
+    assert len(containers) == 1
+    result.stdout.fnmatch_lines(["reset*1x"])
+
+
+def test_volume_cache(testdir: "Testdir", _docker: "Client"):
+    """
+    Ensure that a fresh volume is restored from the cache and not prepared.
+    """
+    volume = f"test-volume-cache-{uuid.uuid4()}"
+    testdir.makeconftest(
+        """
+            def pytest_docker_db_prepare(container, config):
+                print('PREPARED')
+                container.exec_run(
+                    ['psql', '-U', 'postgres', '-c', 'CREATE TABLE t (id int)']
+                )
+        """
+    )
+    testdir.makepyfile(
+        """
+            def test_table(docker_db):
+                result = docker_db.exec_run(
+                    ['psql', '-U', 'postgres', '-c', 'SELECT * FROM t']
+                )
+                assert result.exit_code == 0, result.output
+        """
+    )
+
+    def run():
+        result = testdir.runpytest(
+            "--db-image=postgres:latest",
+            "--db-port=5432",
+            "--db-docker-env-vars=POSTGRES_PASSWORD=foo",
+            f"--db-volume-args={volume}:/var/lib/postgresql/data",
+            "--db-volume-cache",
+            "-s",
+        )
+        _docker.volumes.get(volume).remove(force=True)
+        assert result.ret == 0
+        return result
+
+    first = run()
+    first.stdout.fnmatch_lines(["*PREPARED*", "export_volume*1x"])
+    second = run()
+    second.stdout.no_fnmatch_line("*PREPARED*")
+    second.stdout.fnmatch_lines(["restore_volume*1x"])
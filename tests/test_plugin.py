@@ -0,0 +1,851 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the plugin's internals that use a stand-in for the docker client.
+"""
+
+import re
+import subprocess
+import sys
+import time
+from types import SimpleNamespace
+
+import pytest
+from docker.errors import (
+    APIError,
+    DockerException,
+    ImageNotFound,
+    NotFound,
+)
+
+from pytest_docker_db import engines, labels, plugin
+
+
+class _FakeImages:
+    def __init__(self, local=(), registry=()):
+        self.local = set(local)
+        self.registry = set(registry)
+        self.pulls = []
+
+    def get(self, name):
+        if name not in self.local:
+            raise ImageNotFound(name)
+        return name
+
+    def pull(self, name):
+        self.pulls.append(name)
+        if name not in self.registry:
+            raise APIError(f"pull access denied for {name}")
+        self.local.add(name)
+
+
+class _FakeDocker:
+    def __init__(self, **kwargs):
+        self.images = _FakeImages(**kwargs)
+
+
+@pytest.mark.parametrize(
+    "policy, local, pulls",
+    [
+        ("if-not-present", {"postgres:15"}, []),
+        ("if-not-present", set(), ["postgres:15"]),
+        ("always", {"postgres:15"}, ["postgres:15"]),
+        ("never", {"postgres:15"}, []),
+    ],
+)
+def test_pull_policy(policy, local, pulls):
+    docker = _FakeDocker(local=local, registry={"postgres:15"})
+
+    plugin._pull_image(docker, "postgres:15", policy)
+
+    assert docker.images.pulls == pulls
+    assert "postgres:15" in docker.images.local
+
+
+def test_pull_policy_never_fails_without_local_image():
+    docker = _FakeDocker(registry={"postgres:15"})
+
+    with pytest.raises(pytest.fail.Exception, match="pull policy is 'never'"):
+        plugin._pull_image(docker, "postgres:15", "never")
+
+    assert docker.images.pulls == []
+
+
+def test_pull_failure():
+    docker = _FakeDocker()
+
+    with pytest.raises(pytest.fail.Exception, match="Unable to pull image"):
+        plugin._pull_image(docker, "not-an-image:latest", "if-not-present")
+
+
+def _opts(**kwargs):
+    values = dict(
+        db_image="postgres:15",
+        db_port="5432",
+        configured_host_port=None,
+        configured_db_name=None,
+        db_name="docker-db-random",
+        env_vars=["POSTGRES_PASSWORD=foo"],
+        volume_args=None,
+        tmpfs=None,
+        command=None,
+        snapshot_files=None,
+        docker_file=None,
+        context=None,
+        build_tag=None,
+        seed_files=None,
+        seed_checksum=None,
+        service_name=None,
+        config=SimpleNamespace(
+            getini=lambda key: "",
+            getoption=lambda key, default=None: default,
+            rootpath="/project",
+        ),
+    )
+    values.update(kwargs)
+    return SimpleNamespace(**values)
+
+
+def test_fingerprint():
+    fingerprint = plugin._fingerprint(_opts())
+
+    assert fingerprint == plugin._fingerprint(_opts(db_name="other"))
+    assert fingerprint != plugin._fingerprint(_opts(db_image="postgres:16"))
+    assert fingerprint != plugin._fingerprint(
+        _opts(env_vars=["POSTGRES_PASSWORD=bar"])
+    )
+    assert fingerprint != plugin._fingerprint(
+        _opts(tmpfs={"/var/lib/postgresql/data": "size=512m"})
+    )
+
+
+class _FakeContainer:
+    def __init__(self, name, fingerprint, **extra_labels):
+        self.id = name
+        self.attrs = {
+            "Names": [f"/{name}"],
+            "Labels": {labels.FINGERPRINT: fingerprint, **extra_labels},
+        }
+
+    def reload(self):
+        self.name = self.attrs["Names"][0].lstrip("/")
+
+
+class _FakeContainers:
+    """Filters like the daemon does, the name filter is a regex search."""
+
+    def __init__(self, containers):
+        self.containers = containers
+        self.removed = []
+        self.calls = []
+
+    def list(self, all=False, sparse=False, filters=None):
+        self.calls.append(filters)
+        found = list(self.containers)
+        filters = filters or {}
+        if "label" in filters:
+            key, _, value = filters["label"].partition("=")
+            found = [c for c in found if c.attrs["Labels"].get(key) == value]
+        if "name" in filters:
+            found = [
+                c
+                for c in found
+                if any(re.search(filters["name"], n) for n in c.attrs["Names"])
+            ]
+        return found
+
+
+class _FakeApi:
+    def __init__(self, containers):
+        self.containers = containers
+
+    def kill(self, container):
+        pass
+
+    def remove_container(self, container, v=False, force=False):
+        self.containers.removed.append(container)
+
+
+def test_fingerprint_dockerfile(monkeypatch):
+    digests = []
+
+    def context_digest(context, dockerfile):
+        digests.append(context)
+        return f"{context}-{len(digests)}" * 4
+
+    monkeypatch.setattr(plugin.utils, "context_digest", context_digest)
+    # the Dockerfile takes precedence over db-image
+    opts = _opts(docker_file="Dockerfile", context="ctx")
+
+    fingerprint = plugin._fingerprint(opts)
+
+    assert fingerprint == plugin._fingerprint(opts)
+    assert plugin._build_tag(opts) == opts.build_tag
+    assert digests == ["ctx"]
+    # a changed context changes the fingerprint of new options
+    assert fingerprint != plugin._fingerprint(
+        _opts(docker_file="Dockerfile", context="ctx")
+    )
+
+
+def test_fingerprint_seed(tmp_path):
+    (tmp_path / "users.csv").write_text("id\n1\n")
+    config = SimpleNamespace(rootpath=tmp_path)
+    opts = _opts(config=config, seed_files=["*.csv"])
+
+    fingerprint = plugin._fingerprint(opts)
+
+    assert fingerprint != plugin._fingerprint(_opts())
+    # the files are hashed once per options object
+    (tmp_path / "users.csv").write_text("id\n2\n")
+    assert fingerprint == plugin._fingerprint(opts)
+    assert fingerprint != plugin._fingerprint(
+        _opts(config=config, seed_files=["*.csv"])
+    )
+
+
+def _docker_with(*containers):
+    docker = _FakeDocker()
+    docker.containers = _FakeContainers(list(containers))
+    docker.api = _FakeApi(docker.containers)
+    return docker
+
+
+def test_find_reusable_container():
+    docker = _docker_with(
+        _FakeContainer("stale", "old"), _FakeContainer("fresh", "abc")
+    )
+
+    found = plugin._find_reusable_container(docker, _opts(), "abc")
+
+    assert found.name == "fresh"
+    assert docker.containers.removed == []
+
+
+def test_find_reusable_container_recreates_stale_container():
+    docker = _docker_with(_FakeContainer("test-db", "old"))
+    opts = _opts(configured_db_name="test-db", db_name="test-db")
+
+    assert plugin._find_reusable_container(docker, opts, "abc") is None
+    assert docker.containers.removed == ["test-db"]
+
+
+def test_find_reusable_container_collects_outdated():
+    opts = _opts()
+    key = plugin._reuse_key(opts)
+    now = str(int(time.time()))
+    docker = _docker_with(
+        _FakeContainer("outdated", "old", **{labels.REUSE: key}),
+        _FakeContainer(
+            "recent", "old", **{labels.REUSE: key, labels.CREATED: now}
+        ),
+        _FakeContainer("other-service", "old", **{labels.REUSE: "other"}),
+        _FakeContainer("current", "abc", **{labels.REUSE: key}),
+    )
+    for container in docker.containers.containers:
+        container.attrs["Labels"].setdefault(labels.CREATED, "0")
+
+    found = plugin._find_reusable_container(docker, opts, "abc")
+
+    assert found.name == "current"
+    # older than db-gc-ttl and created with other options
+    assert docker.containers.removed == ["outdated"]
+    assert key != plugin._reuse_key(_opts(service_name="redis"))
+
+
+def test_find_container_by_name_is_exact():
+    docker = _docker_with(
+        _FakeContainer("test-postgres-10", "abc"),
+        _FakeContainer("test-postgres-1", "abc"),
+    )
+
+    found = plugin._find_container_by_name(docker, "test-postgres-1")
+
+    assert found.name == "test-postgres-1"
+    assert docker.containers.calls == [{"name": "^/test\\-postgres\\-1$"}]
+    assert plugin._find_container_by_name(docker, "test-postgres") is None
+
+
+def test_service_sections(tmp_path):
+    ini = tmp_path / "tox.ini"
+    ini.write_text(
+        "[pytest]\n"
+        "db-ready-timeout = 30\n"
+        "[docker-db:postgres]\n"
+        "db-image = postgres:15\n"
+        "db-port = 5432\n"
+        "[docker-db:redis]\n"
+        "db-image = redis:7\n"
+        "db-persist-container = true\n"
+        "[testenv]\n"
+        "commands = pytest {posargs}\n"
+    )
+
+    sections = plugin._service_sections(SimpleNamespace(inipath=ini))
+
+    assert sections == {
+        "postgres": {"db-image": "postgres:15", "db-port": "5432"},
+        "redis": {"db-image": "redis:7", "db-persist-container": "true"},
+    }
+
+
+def _options(**ini):
+    """Builds the options from ini values, no command line args are set."""
+    config = SimpleNamespace(
+        getini=lambda key: ini.get(key, ""),
+        getoption=lambda key: None,
+        stash={},
+    )
+    return plugin._DockerDBOptions(SimpleNamespace(config=config))
+
+
+def test_tmpfs():
+    opts = _options(**{"db-image": "postgres:15", "db-tmpfs": "512m"})
+
+    assert opts.tmpfs == {"/var/lib/postgresql/data": "size=512m"}
+    assert _options(**{"db-image": "postgres:15"}).tmpfs is None
+
+
+def test_tmpfs_uses_snapshot_path():
+    opts = _options(
+        **{
+            "db-image": "memcached:1",
+            "db-tmpfs": "64m",
+            "db-snapshot-path": "/data",
+        }
+    )
+
+    assert opts.tmpfs == {"/data": "size=64m"}
+
+
+def test_tmpfs_unknown_data_dir():
+    opts = _options(**{"db-image": "memcached:1", "db-tmpfs": "64m"})
+
+    with pytest.raises(pytest.fail.Exception, match="db-snapshot-path"):
+        opts.tmpfs
+
+
+def test_tmpfs_with_snapshot_files():
+    with pytest.raises(pytest.fail.Exception, match="db-snapshot-files"):
+        _options(
+            **{
+                "db-image": "postgres:15",
+                "db-tmpfs": "512m",
+                "db-snapshot-files": "migrations/*.sql",
+            }
+        )
+
+
+@pytest.mark.parametrize(
+    "image, command",
+    [
+        ("postgres:15", ["-c", "fsync=off"]),
+        ("mariadb:11", ["--innodb-flush-log-at-trx-commit=0"]),
+    ],
+)
+def test_no_durability(image, command):
+    opts = _options(**{"db-image": image, "db-no-durability": True})
+
+    assert opts.command[: len(command)] == command
+    assert _options(**{"db-image": image}).command is None
+
+
+def test_no_durability_unknown_engine():
+    opts = _options(**{"db-image": "memcached:1", "db-no-durability": True})
+
+    with pytest.raises(pytest.fail.Exception, match="db-no-durability"):
+        opts.command
+
+
+def test_engine_defaults():
+    opts = _options(**{"db-image": "postgres:15"})
+
+    assert opts.db_port == "5432"
+    assert opts.env_vars == ["POSTGRES_PASSWORD=postgres"]
+    assert opts.ready_cmd == "pg_isready -h 127.0.0.1 -U postgres"
+
+
+def test_engine_defaults_do_not_override_configured_values():
+    opts = _options(
+        **{
+            "db-image": "mariadb:11",
+            "db-port": "3307",
+            "db-docker-env-vars": "MARIADB_ROOT_PASSWORD=secret",
+            "db-ready-cmd": "true",
+        }
+    )
+
+    assert opts.db_port == "3307"
+    assert opts.env_vars == ["MARIADB_ROOT_PASSWORD=secret"]
+    assert opts.ready_cmd == "true"
+
+
+def test_engine_option():
+    opts = _options(**{"db-image": "my-registry/db:1", "db-engine": "redis"})
+
+    assert opts.db_port == "6379"
+    assert opts.ready_cmd == "redis-cli ping"
+
+
+def test_unknown_engine():
+    opts = _options(**{"db-image": "postgres:15", "db-engine": "oracle"})
+
+    with pytest.raises(pytest.fail.Exception, match="Unknown db-engine"):
+        opts.db_port
+
+
+def test_registered_engine():
+    class Cockroach(engines.Postgres):
+        name = "cockroach"
+        image_hints = ("cockroach",)
+        default_port = "26257"
+
+    opts = _options(**{"db-image": "cockroachdb/cockroach:v23"})
+    opts.config.stash[plugin._ENGINES_KEY] = {"cockroach": Cockroach}
+
+    assert opts.db_port == "26257"
+
+
+def test_host_port():
+    assert _options(**{"db-image": "postgres:15"}).host_port is None
+
+    opts = _options(**{"db-image": "postgres:15", "db-host-port": "5434"})
+    assert opts.host_port == opts.host_port == "5434"
+
+
+class _StartingContainer:
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.starts = 0
+        self.reloads = 0
+
+    def start(self):
+        self.starts += 1
+        if self.errors:
+            raise self.errors.pop(0)
+
+    def reload(self):
+        self.reloads += 1
+
+
+def _port_conflict():
+    return APIError(
+        "500 Server Error",
+        explanation="Bind for 0.0.0.0:5432 failed: port is already allocated",
+    )
+
+
+def test_start_with_retry(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(plugin.time, "sleep", sleeps.append)
+    container = _StartingContainer(_port_conflict(), _port_conflict())
+
+    plugin._start_with_retry(container, delay=0.1)
+
+    assert container.starts == 3
+    assert sleeps == [0.1, 0.2]
+    # the published port is read back from the reloaded attrs
+    assert container.reloads == 1
+
+
+def test_start_with_retry_gives_up(monkeypatch):
+    monkeypatch.setattr(plugin.time, "sleep", lambda _: None)
+    container = _StartingContainer(*(_port_conflict() for _ in range(3)))
+
+    with pytest.raises(APIError, match="port is already allocated"):
+        plugin._start_with_retry(container, attempts=3)
+
+    assert container.starts == 3
+
+
+def test_start_with_retry_other_errors():
+    container = _StartingContainer(APIError("500 Server Error: no space"))
+
+    with pytest.raises(APIError, match="no space"):
+        plugin._start_with_retry(container)
+
+    assert container.starts == 1
+
+
+def test_import_is_lazy():
+    # docker-py and asyncio are only imported once a database is used
+    heavy = ("docker", "asyncio", "pytest_docker_db.aio")
+    code = (
+        "import sys, pytest_docker_db.plugin\n"
+        f"print([m for m in {heavy!r} if m in sys.modules])"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True
+    )
+
+    assert result.stdout.strip() == "[]", result.stderr
+
+
+def test_collect_leaked_once(monkeypatch):
+    started = []
+    monkeypatch.setattr(
+        plugin.threading,
+        "Thread",
+        lambda **kwargs: SimpleNamespace(
+            start=lambda: started.append(kwargs["name"])
+        ),
+    )
+    monkeypatch.delenv("PYTEST_XDIST_WORKER", raising=False)
+    config = SimpleNamespace(
+        getini=lambda key: "", getoption=lambda key: None, stash={}
+    )
+
+    plugin._collect_leaked(config)
+    plugin._collect_leaked(config)
+
+    assert started == ["docker-db-gc"]
+
+
+def test_lookup_waits_for_gc(monkeypatch):
+    monkeypatch.delenv("PYTEST_XDIST_WORKER", raising=False)
+    collected = []
+
+    def collect(_docker, ttl=None):
+        time.sleep(0.05)
+        collected.append(ttl)
+
+    monkeypatch.setattr(plugin.reaper, "collect", collect)
+    monkeypatch.setattr(plugin, "_docker_client", lambda: None)
+    config = SimpleNamespace(
+        getini=lambda key: "", getoption=lambda key: None, stash={}
+    )
+
+    plugin._collect_leaked(config)
+    plugin._wait_for_gc(config)
+
+    assert collected == [86400.0]
+
+
+class _CloningEngine:
+    database = "app"
+
+    def __init__(self, clones=True, flushes=False):
+        self.clones = clones
+        self.flushes = flushes
+        self.copies = []
+        self.flushed = []
+
+    def clone_database(self, container, template, name):
+        if not self.clones:
+            raise NotImplementedError
+        self.copies.append((container.id, template, name))
+
+    def flush(self, container):
+        if not self.flushes:
+            raise NotImplementedError
+        self.flushed.append(container.id)
+
+
+def _container_cache(monkeypatch, engine):
+    started, torn_down = [], []
+
+    def start(_docker, opts):
+        started.append(opts.db_name)
+        return SimpleNamespace(id=f"c{len(started)}")
+
+    monkeypatch.setattr(plugin, "_start_container", start)
+    monkeypatch.setattr(
+        plugin,
+        "_teardown_container",
+        lambda _docker, container_id, opts: torn_down.append(container_id),
+    )
+    monkeypatch.setattr(plugin, "_engine", lambda opts: engine)
+    return plugin._ContainerCache(None), started, torn_down
+
+
+def test_container_cache_resets(monkeypatch):
+    engine = _CloningEngine()
+    cache, started, torn_down = _container_cache(monkeypatch, engine)
+    opts = _options(**{"db-image": "postgres:15", "db-name": "test-db"})
+
+    first = cache.take("key", opts)
+    cache.give_back("key", first)
+    second = cache.take("key", opts)
+
+    assert second.container is first.container
+    assert started == ["test-db-factory"]
+    assert engine.copies == [
+        ("c1", "app", "app_pristine"),
+        ("c1", "app_pristine", "app"),
+    ]
+    phases = [r["phase"] for r in plugin._timings(opts.config).records]
+    assert phases == ["reset"]
+
+    cache.close()
+    assert torn_down == ["c1"]
+
+
+def test_container_cache_recreates(monkeypatch):
+    cache, started, torn_down = _container_cache(
+        monkeypatch, _CloningEngine(clones=False)
+    )
+    opts = _options(**{"db-image": "redis:7"})
+
+    cache.give_back("key", cache.take("key", opts))
+    second = cache.take("key", opts)
+
+    assert second.container.id == "c2"
+    assert torn_down == ["c1"]
+
+
+def test_container_cache_flushes(monkeypatch):
+    engine = _CloningEngine(clones=False, flushes=True)
+    cache, started, torn_down = _container_cache(monkeypatch, engine)
+    opts = _options(**{"db-image": "redis:7"})
+    prepared = []
+    opts.config.hook = SimpleNamespace(
+        pytest_docker_db_prepare=lambda container, config: prepared.append(
+            container.id
+        )
+    )
+
+    cache.give_back("key", cache.take("key", opts))
+    second = cache.take("key", opts)
+
+    assert second.container.id == "c1"
+    assert engine.flushed == ["c1"]
+    assert prepared == ["c1"]
+    assert torn_down == []
+
+
+def test_container_cache_options_are_read_once(monkeypatch):
+    fingerprints = []
+    monkeypatch.setattr(
+        plugin, "_fingerprint", lambda opts: fingerprints.append(opts) or "k"
+    )
+    cache = plugin._ContainerCache(None)
+    request = SimpleNamespace(
+        config=_options(**{"db-image": "redis:7"}).config
+    )
+
+    first = cache.options(request)
+
+    assert cache.options(request) is first
+    assert len(fingerprints) == 1
+    with pytest.raises(pytest.fail.Exception, match="no \\[docker-db:x\\]"):
+        cache.options(request, "x")
+
+
+def test_container_cache_custom_reset(monkeypatch):
+    engine = _CloningEngine()
+    cache, _, _ = _container_cache(monkeypatch, engine)
+    opts = _options(**{"db-image": "postgres:15"})
+    resets = []
+
+    cache.give_back("key", cache.take("key", opts))
+    cache.take("key", opts, reset=lambda c: resets.append(c.id))
+
+    assert resets == ["c1"]
+    assert len(engine.copies) == 1
+
+
+def test_restore_volumes(monkeypatch, tmp_path):
+    opts = _options(
+        **{
+            "db-image": "postgres:16",
+            "db-volume-args": "pgdata:/var/lib/postgresql/data,logs:/logs",
+        }
+    )
+    opts.config.rootpath = tmp_path
+    opts.config.cache = SimpleNamespace(mkdir=lambda name: tmp_path)
+    cache = plugin._volume_cache(opts)
+    cache.store(plugin._volume_key(opts, "pgdata"), iter([b"tar"]))
+    restored = []
+    monkeypatch.setattr(
+        plugin.volumes,
+        "restore_volume",
+        lambda _docker, volume, image, tarball: restored.append(volume),
+    )
+
+    missing = plugin._restore_volumes(None, opts, ["pgdata", "logs"])
+
+    assert restored == ["pgdata"]
+    assert missing == ["logs"]
+    # the key depends on where the volume is mounted
+    assert plugin._volume_key(opts, "pgdata") != plugin._volume_key(
+        opts, "logs"
+    )
+
+
+class _FakeVolumes:
+    def __init__(self):
+        self.created = []
+
+    def list(self, filters=None):
+        return [v for v in self.created if v == filters["name"]]
+
+    def create(self, name, labels=None):
+        self.created.append(name)
+
+
+def test_launch_creates_named_volumes(monkeypatch, tmp_path):
+    docker = _FakeDocker(local={"postgres:16"})
+    docker.volumes = _FakeVolumes()
+    docker.containers = _FakeContainers([])
+    created = SimpleNamespace(id="c1", status="running")
+    docker.containers.create = lambda **kwargs: created
+    monkeypatch.setattr(plugin, "_wait_until_ready", lambda *args: None)
+    restored = []
+
+    def restore_volumes(_docker, opts, fresh):
+        restored.extend(fresh)
+        return fresh
+
+    monkeypatch.setattr(plugin, "_restore_volumes", restore_volumes)
+    opts = _options(
+        **{
+            "db-image": "postgres:16",
+            "db-volume-args": (
+                f"pgdata:/var/lib/postgresql/data,{tmp_path}:/logs"
+            ),
+            "db-volume-cache": "true",
+        }
+    )
+
+    launched = plugin._launch_container(docker, opts)
+
+    # the host path is not a volume
+    assert docker.volumes.created == ["pgdata"]
+    assert restored == ["pgdata"]
+    assert launched.to_export == ["pgdata"]
+    assert not launched.restored
+
+
+@pytest.mark.parametrize(
+    "fresh, missing, restored",
+    [
+        (["pgdata", "logs"], ["logs"], True),
+        (["pgdata", "logs"], ["pgdata"], False),
+        # only a logs volume was restored, the database is prepared
+        (["logs"], [], False),
+    ],
+)
+def test_restored_data_dir(fresh, missing, restored):
+    opts = _options(
+        **{
+            "db-image": "postgres:16",
+            "db-volume-args": "pgdata:/var/lib/postgresql/data/,logs:/logs",
+        }
+    )
+
+    assert plugin._restored_data_dir(opts, fresh, missing) is restored
+
+
+@pytest.mark.parametrize("workers, collected", [(2, True), (None, False)])
+def test_xdist_controller_collects_leaked(monkeypatch, workers, collected):
+    monkeypatch.delenv("PYTEST_XDIST_WORKER", raising=False)
+    calls = []
+    monkeypatch.setattr(plugin, "_collect_leaked", calls.append)
+    options = {"numprocesses": workers, "collectonly": False}
+    config = SimpleNamespace(
+        getini=lambda key: "",
+        getoption=lambda key, default=None: options.get(key, default),
+    )
+
+    plugin.pytest_sessionstart(SimpleNamespace(config=config))
+
+    assert calls == ([config] if collected else [])
+
+
+def _prewarm_session(fixturenames):
+    ini = {"db-image": "postgres:16", "db-prewarm": True}
+    config = SimpleNamespace(
+        getini=lambda key: ini.get(key, ""),
+        getoption=lambda key, default=None: default,
+        stash={},
+    )
+    item = SimpleNamespace(fixturenames=fixturenames)
+    return SimpleNamespace(config=config, items=[item])
+
+
+@pytest.mark.parametrize("fixturenames", [["docker_db"], ["tmp_path"]])
+def test_prewarm_collected(monkeypatch, fixturenames):
+    monkeypatch.delenv("PYTEST_XDIST_WORKER", raising=False)
+    monkeypatch.setattr(plugin, "_collect_leaked", lambda config: None)
+    monkeypatch.setattr(plugin, "_docker_client", lambda: "client")
+    started = []
+    monkeypatch.setattr(
+        plugin._Prewarm, "start", lambda self, key, opts: started.append(key)
+    )
+    session = _prewarm_session(fixturenames)
+
+    plugin.pytest_collection_finish(session)
+
+    if "docker_db" in fixturenames:
+        assert started == ["docker_db"]
+        session.config.stash[plugin._PREWARM_KEY].shutdown()
+    else:
+        # no collected test uses the container, docker is never used
+        assert started == []
+        assert plugin._PREWARM_KEY not in session.config.stash
+
+
+def test_prewarm_unreachable_daemon(monkeypatch):
+    monkeypatch.delenv("PYTEST_XDIST_WORKER", raising=False)
+    monkeypatch.setattr(plugin, "_collect_leaked", lambda config: None)
+
+    def unreachable():
+        raise DockerException("Error while fetching server API version")
+
+    monkeypatch.setattr(plugin, "_docker_client", unreachable)
+    session = _prewarm_session(["docker_db"])
+
+    with pytest.warns(pytest.PytestWarning, match="db-prewarm is skipped"):
+        plugin.pytest_collection_finish(session)
+
+    assert plugin._PREWARM_KEY not in session.config.stash
+
+
+def test_pooled_container_is_gone(monkeypatch):
+    released = []
+
+    class _PoolClient:
+        def __init__(self, path):
+            pass
+
+        def lease(self, timeout=None):
+            return {"id": "gone", "name": "docker-db-pool-gone"}
+
+        def release(self):
+            released.append(True)
+
+    def get(container_id):
+        raise NotFound(container_id)
+
+    monkeypatch.setattr(plugin.pool, "PoolClient", _PoolClient)
+    docker = SimpleNamespace(containers=SimpleNamespace(get=get))
+    opts = _options(**{"db-pool": "/tmp/pool.sock"})
+
+    with pytest.raises(pytest.fail.Exception, match="gone"):
+        next(plugin._pooled_docker_db(docker, opts))
+    assert released == [True]
+
+
+def test_prewarm_defers_set_up(monkeypatch):
+    container = SimpleNamespace(id="c1")
+    launched = plugin._Launched(container, True, False, None, [])
+    monkeypatch.setattr(
+        plugin, "_launch_container", lambda _docker, opts: launched
+    )
+    prepared = []
+    opts = _options(**{"db-image": "postgres:16"})
+    opts.config.hook = SimpleNamespace(
+        pytest_docker_db_prepare=lambda container, config: prepared.append(
+            container.id
+        )
+    )
+    prewarm = plugin._Prewarm(None)
+    prewarm.start("docker_db", opts)
+
+    _, future = prewarm.take("docker_db")
+
+    # the hook is not called in the background
+    assert future.result() is launched
+    assert prepared == []
+    assert plugin._set_up_container(None, opts, launched) is container
+    assert prepared == ["c1"]
+    prewarm.shutdown()
@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the warm pool with a stand-in for the docker client.
+"""
+
+import itertools
+import os
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+from docker.errors import DockerException
+
+from pytest_docker_db import labels
+from pytest_docker_db.pool import (
+    ContainerPool,
+    PoolClient,
+    PoolError,
+    PoolServer,
+)
+
+
+class _FakeContainer:
+    def __init__(self, container_id, name, status="created", error=None):
+        self.id = container_id
+        self.name = name
+        self.status = status
+        self.attrs = {"Config": {}}
+        self.error = error
+
+    def start(self):
+        if self.error is not None:
+            raise self.error
+        self.status = "running"
+
+    def reload(self):
+        pass
+
+
+class _FakeContainers:
+    def __init__(self):
+        self.created = []
+        self.start_errors = []
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+
+    def create(self, image, name, labels=None, **kwargs):
+        with self._lock:
+            error = self.start_errors.pop(0) if self.start_errors else None
+            container = _FakeContainer(
+                f"id-{next(self._ids)}", name, error=error
+            )
+            container.image = image
+            container.labels = labels
+            self.created.append(container)
+        return container
+
+
+class _FakeDocker:
+    def __init__(self):
+        self.containers = _FakeContainers()
+        self.removed = []
+        self.api = SimpleNamespace(
+            base_url="http+docker://localhost",
+            remove_container=lambda cid, **kwargs: self.removed.append(cid),
+        )
+
+
+def _wait_for(condition):
+    for _ in range(200):
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+@pytest.fixture
+def container_pool():
+    container_pool = ContainerPool(_FakeDocker(), "postgres:15", size=2)
+    yield container_pool
+    container_pool.close()
+
+
+def test_fill(container_pool):
+    container_pool.fill()
+
+    container_pool.lease(timeout=1)
+    container_pool.lease(timeout=1)
+
+    created = container_pool.client.containers.created
+    assert {c.image for c in created} == {"postgres:15"}
+    assert created[0].labels[labels.MANAGED] == "true"
+    assert created[0].labels[labels.POOL] == container_pool.pool_id
+    assert created[0].labels[labels.OWNER_PID] == str(os.getpid())
+
+
+def test_lease_starts_a_replacement(container_pool):
+    container_pool.fill()
+
+    container = container_pool.lease(timeout=1)
+
+    container_pool._workers.shutdown(wait=True)
+    assert container.status == "running"
+    assert len(container_pool.client.containers.created) == 3
+    assert container_pool.status() == {"ready": 2, "leased": 1, "starting": 0}
+
+
+def test_lease_timeout():
+    container_pool = ContainerPool(_FakeDocker(), "postgres:15", size=0)
+
+    with pytest.raises(PoolError, match="No container was ready"):
+        container_pool.lease(timeout=0.01)
+
+
+def test_start_error_frees_the_slot(container_pool):
+    # e.g. the daemon restarted while the container was starting
+    container_pool.client.containers.start_errors = [
+        DockerException("Error while fetching server API version"),
+        ConnectionError("Connection aborted."),
+    ]
+
+    container_pool.fill()
+    container_pool._workers.shutdown(wait=True)
+
+    assert container_pool.status() == {"ready": 0, "leased": 0, "starting": 0}
+    assert set(container_pool.client.removed) == {"id-0", "id-1"}
+
+
+def test_start_error_is_replaced():
+    container_pool = ContainerPool(_FakeDocker(), "postgres:15", size=1)
+    container_pool.client.containers.start_errors = [
+        DockerException("Error while fetching server API version")
+    ]
+
+    container_pool.fill()
+    assert _wait_for(lambda: container_pool.status()["starting"] == 0)
+    container_pool.fill()
+
+    container = container_pool.lease(timeout=1)
+    container_pool.close()
+    assert container.id == "id-1"
+
+
+def test_release_removes_the_container(container_pool):
+    container_pool.fill()
+    container = container_pool.lease(timeout=1)
+
+    container_pool.release(container.id)
+
+    container_pool._workers.shutdown(wait=True)
+    assert container.id in container_pool.client.removed
+    assert container_pool.status()["leased"] == 0
+
+
+def test_close_removes_every_container(container_pool):
+    container_pool.fill()
+    leased = container_pool.lease(timeout=1)
+
+    container_pool.close()
+
+    created = {c.id for c in container_pool.client.containers.created}
+    assert leased.id in created
+    assert set(container_pool.client.removed) == created
+
+
+@pytest.fixture
+def server(tmp_path, container_pool):
+    server = PoolServer(str(tmp_path / "pool.sock"), container_pool)
+    container_pool.fill()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_client_lease_and_release(server):
+    client = PoolClient(server.server_address)
+
+    lease = client.lease(timeout=1)
+    assert lease["name"].startswith("docker-db-pool-")
+    client.release()
+
+    assert _wait_for(lambda: lease["id"] in server.pool.client.removed)
+
+
+def test_disconnect_releases_the_lease(server):
+    client = PoolClient(server.server_address)
+    lease = client.lease(timeout=1)
+
+    # a session that crashed never sends release
+    client._sock.close()
+    client._file.close()
+
+    assert _wait_for(lambda: lease["id"] in server.pool.client.removed)
+
+
+def test_client_without_daemon(tmp_path):
+    client = PoolClient(str(tmp_path / "missing.sock"))
+
+    with pytest.raises(PoolError, match="Unable to connect to the pool"):
+        client.lease()
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+from types import SimpleNamespace
+
+import pytest
+
+from pytest_docker_db import readiness
+
+
+class _FakeContainer:
+    def __init__(self, logs=b"", status="running", health=None):
+        self.name = "fake"
+        self.status = status
+        self._logs = logs
+        self.attrs = {"State": {}, "Config": {}}
+        if health is not None:
+            self.attrs["State"]["Health"] = {"Status": health}
+            self.attrs["Config"]["Healthcheck"] = {"Test": ["CMD", "true"]}
+        self.reloads = 0
+
+    def reload(self):
+        self.reloads += 1
+
+    def logs(self, **kwargs):
+        return self._logs
+
+    def exec_run(self, cmd):
+        return SimpleNamespace(exit_code=0 if cmd == "true" else 1)
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def test_wait_until_ready_backs_off_until_probe_passes():
+    container = _FakeContainer(logs=b"starting\n")
+    clock = _Clock()
+
+    class _ReadyAfter(readiness.Probe):
+        def check(self, container):
+            return container.reloads >= 4
+
+    readiness.wait_until_ready(
+        container,
+        [_ReadyAfter()],
+        timeout=10,
+        initial_delay=0.1,
+        max_delay=0.3,
+        clock=clock,
+        sleep=clock.sleep,
+    )
+
+    assert clock.sleeps == [0.1, 0.2, 0.3]
+
+
+def test_wait_until_ready_times_out():
+    container = _FakeContainer(logs=b"starting\n")
+    clock = _Clock()
+
+    with pytest.raises(readiness.ReadinessError, match="not ready after 1"):
+        readiness.wait_until_ready(
+            container,
+            [readiness.LogProbe("ready to accept connections")],
+            timeout=1,
+            clock=clock,
+            sleep=clock.sleep,
+        )
+
+
+def test_wait_until_ready_fails_fast_when_container_exits():
+    container = _FakeContainer(status="exited")
+
+    with pytest.raises(readiness.ReadinessError, match="stopped"):
+        readiness.wait_until_ready(
+            container, [readiness.ExecProbe("true")], timeout=10
+        )
+
+
+def test_probes():
+    logs = b"ready to accept connections\nready to accept connections\n"
+    container = _FakeContainer(logs=logs, health="starting")
+
+    assert readiness.LogProbe("accept connections", occurrences=2).check(
+        container
+    )
+    assert not readiness.LogProbe("accept", occurrences=3).check(container)
+    assert readiness.ExecProbe("true").check(container)
+    assert not readiness.ExecProbe("false").check(container)
+    assert readiness.has_healthcheck(container)
+    assert not readiness.HealthcheckProbe().check(container)
+    container.attrs["State"]["Health"]["Status"] = "healthy"
+    assert readiness.HealthcheckProbe().check(container)
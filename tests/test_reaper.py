@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+import os
+import socket
+import subprocess
+import sys
+from types import SimpleNamespace
+
+import pytest
+from docker.errors import NotFound
+
+from pytest_docker_db import labels, reaper
+
+
+class _FakeApi:
+    def __init__(self, missing=()):
+        self.calls = []
+        self.missing = set(missing)
+
+    def _call(self, *args, **kwargs):
+        self.calls.append((args, kwargs))
+        if args[1] in self.missing:
+            raise NotFound(args[1])
+
+    def kill(self, container, signal=None):
+        self._call("kill", container, signal=signal)
+
+    def rename(self, container, name):
+        self._call("rename", container, name)
+
+    def stop(self, container, timeout=None):
+        self._call("stop", container, timeout=timeout)
+
+    def remove_container(self, container, v=False, force=False):
+        self._call("remove_container", container, v=v, force=force)
+
+    def remove_volume(self, name, force=False):
+        self._call("remove_volume", name, force=force)
+
+
+class _FakeDocker:
+    def __init__(self, containers=(), volumes=(), missing=(), labels=None):
+        self.api = _FakeApi(missing)
+        self.filters = []
+        self.containers = SimpleNamespace(list=self._list(containers, labels))
+        self.volumes = SimpleNamespace(list=self._list(volumes))
+
+    def _list(self, items, labels=None):
+        def list_(all=False, sparse=False, filters=None):
+            self.filters.append(filters)
+            return [
+                SimpleNamespace(
+                    id=i, name=i, attrs={"Labels": (labels or {}).get(i, {})}
+                )
+                for i in items
+            ]
+
+        return list_
+
+
+def test_add_signals_stop_and_frees_the_name():
+    docker = _FakeDocker()
+    background = reaper.Reaper(stop_timeout=5)
+
+    background.add(docker, "0123456789abcdef")
+
+    assert docker.api.calls == [
+        (("kill", "0123456789abcdef"), {"signal": "SIGTERM"}),
+        (("rename", "0123456789abcdef", "docker-db-reaped-0123456789ab"), {}),
+    ]
+    assert background.container_ids == ["0123456789abcdef"]
+
+
+def test_spawn(monkeypatch):
+    spawned = []
+    monkeypatch.setattr(
+        subprocess, "Popen", lambda cmd, **kwargs: spawned.append(cmd)
+    )
+    background = reaper.Reaper(stop_timeout=5)
+    background.spawn()
+    assert spawned == []
+
+    background.container_ids = ["a", "b"]
+    background.spawn()
+
+    cmd = [sys.executable, "-m", "pytest_docker_db.cli", "reap"]
+    assert spawned == [cmd + ["--timeout", "5", "a", "b"]]
+    assert background.container_ids == []
+
+
+def test_reap():
+    docker = _FakeDocker(missing={"gone"})
+
+    reaper.reap(docker, ["a", "gone"], timeout=3)
+
+    calls = sorted(docker.api.calls)
+    assert calls == [
+        (("remove_container", "a"), {"v": True, "force": True}),
+        (("stop", "a"), {"timeout": 3}),
+        (("stop", "gone"), {"timeout": 3}),
+    ]
+
+
+def test_cleanup():
+    docker = _FakeDocker(containers=["a", "b"], volumes=["data"])
+
+    removed = reaper.cleanup(docker)
+
+    assert removed == {"containers": ["a", "b"], "volumes": ["data"]}
+    assert docker.filters == [{"label": labels.MANAGED}] * 2
+    assert sorted(args for args, _ in docker.api.calls) == [
+        ("remove_container", "a"),
+        ("remove_container", "b"),
+        ("remove_volume", "data"),
+    ]
+
+
+def test_cleanup_dry_run():
+    docker = _FakeDocker(containers=["a"], volumes=["data"])
+
+    removed = reaper.cleanup(docker, dry_run=True)
+
+    assert removed == {"containers": ["a"], "volumes": ["data"]}
+    assert docker.api.calls == []
+
+
+def _dead_pid():
+    # a pid that is above the limit can't belong to a running process
+    with open("/proc/sys/kernel/pid_max") as f:
+        return int(f.read()) + 1
+
+
+def _labels(pid=None, host=None, created=None, persist=False):
+    owner = reaper.owner_labels(persist)
+    if pid is not None:
+        owner[labels.OWNER_PID] = str(pid)
+    if host is not None:
+        owner[labels.OWNER_HOST] = host
+    if created is not None:
+        owner[labels.CREATED] = str(created)
+    return owner
+
+
+def test_owner_labels(monkeypatch):
+    monkeypatch.delenv("PYTEST_XDIST_WORKER", raising=False)
+
+    owner = reaper.owner_labels()
+
+    assert owner[labels.OWNER_PID] == str(os.getpid())
+    assert owner[labels.OWNER_HOST] == socket.gethostname()
+    assert labels.PERSIST not in owner
+
+
+def test_owner_labels_xdist_worker(monkeypatch):
+    monkeypatch.setenv("PYTEST_XDIST_WORKER", "gw0")
+
+    assert reaper.owner_labels()[labels.OWNER_PID] == str(os.getppid())
+
+
+@pytest.mark.skipif(
+    not os.path.exists("/proc/sys/kernel/pid_max"), reason="needs linux"
+)
+def test_is_leaked():
+    now = 1_000_000
+    elsewhere = _labels(host="other-host", created=now)
+    assert not reaper.is_leaked(elsewhere, ttl=60, now=now)
+    assert reaper.is_leaked(elsewhere, ttl=60, now=now + 61)
+    assert not reaper.is_leaked(elsewhere, ttl=None, now=now + 61)
+
+    # e.g. the ready containers of a long running pool
+    alive = _labels(created=now)
+    assert not reaper.is_leaked(alive, ttl=60, now=now + 61)
+    pool_elsewhere = {**elsewhere, labels.POOL: "abc"}
+    assert not reaper.is_leaked(pool_elsewhere, ttl=60, now=now + 61)
+    pool_dead = {**_labels(pid=_dead_pid(), created=now), labels.POOL: "abc"}
+    assert reaper.is_leaked(pool_dead, ttl=60, now=now)
+
+    assert reaper.is_leaked(_labels(pid=_dead_pid()), ttl=None)
+    # the owner's host would have to be asked
+    dead_elsewhere = _labels(pid=_dead_pid(), host="other-host")
+    assert not reaper.is_leaked(dead_elsewhere, ttl=None)
+
+    persisted = _labels(pid=_dead_pid(), created=0, persist=True)
+    assert not reaper.is_leaked(persisted, ttl=60, now=now)
+
+    # created by an older version of the plugin
+    assert not reaper.is_leaked({labels.MANAGED: "true"}, ttl=60, now=now)
+
+
+@pytest.mark.skipif(
+    not os.path.exists("/proc/sys/kernel/pid_max"), reason="needs linux"
+)
+def test_collect():
+    docker = _FakeDocker(
+        containers=["mine", "leaked"],
+        labels={"mine": _labels(), "leaked": _labels(pid=_dead_pid())},
+    )
+
+    assert reaper.collect(docker, dry_run=True) == ["leaked"]
+    assert docker.api.calls == []
+
+    assert reaper.collect(docker) == ["leaked"]
+    assert docker.api.calls == [
+        (("remove_container", "leaked"), {"v": True, "force": True})
+    ]
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+import sys
+import threading
+
+import pytest
+
+from pytest_docker_db import adapters, seed
+
+
+class _Connection:
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class _FakeAdapter(adapters.PostgresAdapter):
+    """Keeps the "database" in memory."""
+
+    def __init__(self):
+        super().__init__("postgresql://postgres@localhost:5432/postgres")
+        self.checksum = None
+        self.calls = []
+        self.loaded = {}
+        self.lock = threading.Lock()
+
+    def seed_connect(self):
+        return _Connection()
+
+    def seed_checksum(self, conn):
+        return self.checksum
+
+    def set_seed_checksum(self, conn, checksum):
+        self.checksum = checksum
+
+    def truncate(self, conn, tables):
+        self.calls.append(("truncate", sorted(tables)))
+
+    def execute_script(self, conn, sql):
+        self.calls.append(("script", sql))
+
+    def load_csv(self, conn, table, columns, path):
+        with open(path) as f:
+            rows = f.read().splitlines()[1:]
+        with self.lock:
+            self.loaded[table] = (columns, rows)
+
+
+@pytest.fixture
+def seed_dir(tmp_path):
+    (tmp_path / "schema.sql").write_text("CREATE TABLE users (id int);")
+    (tmp_path / "users.csv").write_text("id,name\n1,alice\n2,bob\n")
+    (tmp_path / "public.orders.csv").write_text("id\n1\n")
+    return tmp_path
+
+
+def _files():
+    return ["public.orders.csv", "schema.sql", "users.csv"]
+
+
+def test_load(seed_dir):
+    adapter = _FakeAdapter()
+
+    assert seed.load(adapter, str(seed_dir), _files())
+
+    assert adapter.calls == [("script", "CREATE TABLE users (id int);")]
+    assert adapter.loaded == {
+        '"users"': (['"id"', '"name"'], ["1,alice", "2,bob"]),
+        '"public"."orders"': (['"id"'], ["1"]),
+    }
+    assert adapter.checksum == seed.checksum(str(seed_dir), _files())
+
+
+def test_unchanged_seed_is_skipped(seed_dir):
+    adapter = _FakeAdapter()
+    seed.load(adapter, str(seed_dir), _files())
+    adapter.calls, adapter.loaded = [], {}
+
+    assert not seed.load(adapter, str(seed_dir), _files())
+
+    assert adapter.calls == []
+    assert adapter.loaded == {}
+
+
+def test_changed_seed_replaces_the_data(seed_dir):
+    adapter = _FakeAdapter()
+    seed.load(adapter, str(seed_dir), _files())
+    adapter.calls = []
+
+    (seed_dir / "users.csv").write_text("id,name\n3,carol\n")
+    assert seed.load(adapter, str(seed_dir), _files())
+
+    assert adapter.calls == [
+        ("truncate", ['"public"."orders"', '"users"']),
+        # the scripts run again on the existing tables
+        ("script", "CREATE TABLE users (id int);"),
+    ]
+    assert adapter.loaded['"users"'][1] == ["3,carol"]
+
+
+def test_unsupported_file(tmp_path):
+    (tmp_path / "users.json").write_text("[]")
+
+    with pytest.raises(seed.SeedError, match="users.json"):
+        seed.load(_FakeAdapter(), str(tmp_path), ["users.json"])
+
+
+def test_parquet_needs_pyarrow(tmp_path, monkeypatch):
+    monkeypatch.setitem(sys.modules, "pyarrow", None)
+    (tmp_path / "users.parquet").write_bytes(b"PAR1")
+
+    with pytest.raises(seed.SeedError, match="pyarrow"):
+        seed.load(_FakeAdapter(), str(tmp_path), ["users.parquet"])
+
+
+def test_parquet(tmp_path):
+    pa = pytest.importorskip("pyarrow")
+    pq = pytest.importorskip("pyarrow.parquet")
+    table = pa.table({"id": [1, 2], "name": ["alice", None]})
+    pq.write_table(table, str(tmp_path / "users.parquet"))
+    adapter = _FakeAdapter()
+
+    seed.load(adapter, str(tmp_path), ["users.parquet"])
+
+    assert adapter.loaded == {
+        '"users"': (['"id"', '"name"'], ['1,"alice"', "2,"])
+    }
+
+
+def test_checksum(seed_dir):
+    digest = seed.checksum(str(seed_dir), _files())
+
+    (seed_dir / "users.csv").write_text("id,name\n1,alice\n")
+    assert digest != seed.checksum(str(seed_dir), _files())
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+import multiprocessing
+
+from pytest_docker_db.shared import SharedState
+
+
+def _increment(root, times):
+    state = SharedState(root, "counter")
+    for _ in range(times):
+        with state.locked() as data:
+            data["count"] = data.get("count", 0) + 1
+
+
+def test_shared_state_is_process_safe(tmp_path):
+    procs = [
+        multiprocessing.Process(target=_increment, args=(tmp_path, 25))
+        for _ in range(4)
+    ]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+
+    assert SharedState(tmp_path, "counter").read() == {"count": 100}
+
+
+def test_shared_state_not_written_on_error(tmp_path):
+    state = SharedState(tmp_path, "state")
+    with state.locked() as data:
+        data["container_id"] = "abc"
+
+    try:
+        with state.locked() as data:
+            data["container_id"] = None
+            raise RuntimeError()
+    except RuntimeError:
+        pass
+
+    assert state.read() == {"container_id": "abc"}
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+import os
+import tarfile
+
+from pytest_docker_db import snapshot
+
+
+class _FakeContainer:
+    def __init__(self):
+        self.stopped = False
+
+    def stop(self):
+        self.stopped = True
+
+    def get_archive(self, path):
+        return iter([b"data-", b"archive"]), {}
+
+
+class _FakeImages:
+    def build(self, fileobj, **kwargs):
+        self.kwargs = kwargs
+        with tarfile.open(fileobj=fileobj) as tar:
+            self.context = {
+                m.name: tar.extractfile(m).read() for m in tar.getmembers()
+            }
+
+
+class _FakeDocker:
+    def __init__(self):
+        self.images = _FakeImages()
+
+
+def test_snapshot_key_changes_with_files(tmp_path):
+    migrations = tmp_path / "migrations"
+    migrations.mkdir()
+    (migrations / "0001.sql").write_text("CREATE TABLE a (id int);")
+    (tmp_path / "other.txt").write_text("unrelated")
+
+    files = snapshot.snapshot_files(str(tmp_path), ["migrations/**/*.sql"])
+    assert files == [os.path.join("migrations", "0001.sql")]
+
+    def key():
+        return snapshot.snapshot_key(
+            str(tmp_path), files, "postgres:15", ["A=1"], "/data"
+        )
+
+    first = key()
+    assert first == key()
+    (migrations / "0001.sql").write_text("CREATE TABLE b (id int);")
+    assert first != key()
+    assert snapshot.snapshot_tag(first).startswith(
+        "pytest-docker-db-snapshot:"
+    )
+
+
+def test_create_snapshot_archives_data_dir():
+    docker = _FakeDocker()
+    container = _FakeContainer()
+
+    snapshot.create_snapshot(
+        docker,
+        container,
+        "postgres:15",
+        "pytest-docker-db-snapshot:abc",
+        "/var/lib/postgresql/data/",
+    )
+
+    assert container.stopped
+    assert docker.images.kwargs["tag"] == "pytest-docker-db-snapshot:abc"
+    assert docker.images.context == {
+        "Dockerfile": b"FROM postgres:15\nADD data.tar /var/lib/postgresql/\n",
+        "data.tar": b"data-archive",
+    }
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+import json
+from itertools import count
+
+import pytest
+
+from pytest_docker_db.timing import Timings
+
+
+def _timings():
+    # every call of the clock advances it by one second
+    ticks = count()
+    return Timings(clock=lambda: float(next(ticks)))
+
+
+def test_phase():
+    timings = _timings()
+
+    with timings.phase("pull", "db"):
+        pass
+
+    assert timings.records == [
+        {"phase": "pull", "target": "db", "seconds": 1.0}
+    ]
+
+
+def test_phase_is_recorded_on_error():
+    timings = _timings()
+
+    with pytest.raises(RuntimeError):
+        with timings.phase("start", "db"):
+            raise RuntimeError("boom")
+
+    assert [r["phase"] for r in timings.records] == ["start"]
+
+
+def test_summary():
+    timings = Timings()
+    timings.record("teardown", 0.5, "db")
+    timings.record("custom", 1.0)
+    timings.record("ready", 2.0, "db")
+    timings.record("ready", 4.0, "cache")
+
+    summary = timings.summary()
+
+    assert list(summary) == ["ready", "teardown", "custom"]
+    assert summary["ready"] == {"count": 2, "total": 6.0, "max": 4.0}
+
+
+def test_to_json():
+    timings = Timings()
+    timings.extend([{"phase": "pull", "target": "db", "seconds": 3.0}])
+
+    data = json.loads(timings.to_json())
+
+    assert data["phases"] == {"pull": {"count": 1, "total": 3.0, "max": 3.0}}
+    assert data["records"] == timings.records
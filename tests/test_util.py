@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from pytest_docker_db import util
+
+
+def test_context_digest_respects_dockerignore(tmp_path):
+    (tmp_path / "Dockerfile").write_text("FROM postgres:latest")
+    (tmp_path / "init.sql").write_text("CREATE TABLE a (id int);")
+    (tmp_path / "node_modules").mkdir()
+    (tmp_path / "node_modules" / "big.js").write_text("1")
+    (tmp_path / ".dockerignore").write_text("# comment\nnode_modules\n")
+
+    digest = util.context_digest(str(tmp_path), "Dockerfile")
+
+    (tmp_path / "node_modules" / "big.js").write_text("2")
+    assert digest == util.context_digest(str(tmp_path), "Dockerfile")
+
+    (tmp_path / "init.sql").write_text("CREATE TABLE b (id int);")
+    assert digest != util.context_digest(str(tmp_path), "Dockerfile")
+
+
+def test_docker_host():
+    assert util.docker_host("http+docker://localhost") == "localhost"
+    assert util.docker_host("http://10.0.0.5:2375") == "10.0.0.5"
+    assert util.docker_host("npipe:////./pipe/docker_engine") == "localhost"
+
+
+def test_read_chunks(tmp_path):
+    path = tmp_path / "data.csv"
+    path.write_bytes(b"0123456789")
+    (tmp_path / "empty.csv").write_bytes(b"")
+
+    chunks = list(util.read_chunks(str(path), size=4))
+
+    assert chunks == [b"0123", b"4567", b"89"]
+    assert list(util.read_chunks(str(tmp_path / "empty.csv"))) == []
+
+
+@pytest.mark.parametrize(
+    "source, named",
+    [
+        ("pgdata", True),
+        ("pg_data.v2", True),
+        ("/tmp/docker", False),
+        ("./data", False),
+        ("~/data", False),
+        ("data/pg", False),
+        ("C:\\data", False),
+        ("", False),
+    ],
+)
+def test_is_named_volume(source, named):
+    assert util.is_named_volume(source) is named
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+import gzip
+import io
+import tarfile
+
+import pytest
+
+from pytest_docker_db import labels, volumes
+
+
+def _tar(files):
+    data = io.BytesIO()
+    with tarfile.open(fileobj=data, mode="w") as tar:
+        for name, content in files.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            info.uid = 999
+            tar.addfile(info, io.BytesIO(content))
+    return data.getvalue()
+
+
+def test_store_and_lookup(tmp_path):
+    cache = volumes.VolumeCache(tmp_path)
+    archive = _tar({"volume/PG_VERSION": b"16\n"})
+
+    assert cache.lookup("key") is None
+    tarball = cache.store("key", iter([archive[:100], archive[100:]]))
+
+    assert cache.lookup("key") == tarball
+    cache.verify(tarball)
+    assert gzip.decompress(tarball.read_bytes()) == archive
+    # the same content is stored as the same tarball
+    assert cache.store("other", iter([archive])) == tarball
+    assert sorted(p.suffix for p in tmp_path.iterdir()) == [
+        ".gz",
+        ".ref",
+        ".ref",
+    ]
+
+
+def test_verify_corrupt_tarball(tmp_path):
+    cache = volumes.VolumeCache(tmp_path)
+    tarball = cache.store("key", iter([_tar({"volume/a": b"a"})]))
+    tarball.write_bytes(tarball.read_bytes()[:-4])
+
+    with pytest.raises(volumes.VolumeCacheError, match="corrupt"):
+        cache.verify(tarball)
+
+
+def test_store_failure_leaves_nothing(tmp_path):
+    cache = volumes.VolumeCache(tmp_path)
+
+    def stream():
+        yield b"partial"
+        raise IOError("connection reset")
+
+    with pytest.raises(IOError):
+        cache.store("key", stream())
+
+    assert list(tmp_path.iterdir()) == []
+
+
+class _Helper:
+    def __init__(self, daemon, kwargs):
+        self.daemon = daemon
+        self.kwargs = kwargs
+
+    def get_archive(self, path):
+        return iter([self.daemon.volume_content]), {"name": path}
+
+    def put_archive(self, path, data):
+        self.daemon.put.append((path, data.read()))
+
+    def remove(self, v=False, force=False):
+        self.daemon.removed += 1
+
+
+class _Daemon:
+    def __init__(self, volume_content=b""):
+        self.volume_content = volume_content
+        self.created = []
+        self.put = []
+        self.removed = 0
+        self.containers = self
+
+    def create(self, **kwargs):
+        self.created.append(kwargs)
+        return _Helper(self, kwargs)
+
+
+def test_export_and_restore(tmp_path):
+    archive = _tar({"volume/PG_VERSION": b"16\n"})
+    daemon = _Daemon(archive)
+    cache = volumes.VolumeCache(tmp_path)
+
+    tarball = volumes.export_volume(
+        daemon, "pgdata", "postgres:16", cache, "k"
+    )
+    volumes.restore_volume(daemon, "pgdata", "postgres:16", tarball)
+
+    assert daemon.put == [("/", tarball.read_bytes())]
+    assert daemon.removed == 2
+    helper = daemon.created[0]
+    assert helper["volumes"] == ["pgdata:/volume:rw"]
+    assert helper["labels"][labels.MANAGED] == "true"